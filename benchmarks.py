@@ -0,0 +1,136 @@
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from rex import Symbol, Union, Concatenation, KleneeStar, parse
+from search import ByteSearcher
+from cfg import ContextFreeGrammar
+from grammar_symbol import NonTerminal, Terminal
+from grammar_rule import GrammarRule
+from my_parser import Parser
+
+
+def bench_search(size: int = 8 << 20):
+    digit = Union(Symbol("0"), Union(Symbol("1"), Symbol("2")))
+    pattern = Concatenation(Symbol("e"), Concatenation(Symbol("r"), Concatenation(digit, KleneeStar(digit))))
+    searcher = ByteSearcher(pattern.rex2lts().compile())
+
+    random.seed(0)
+    alphabet = b"abcdefghijklmnopqrstuvwxyz0123 \n"
+    data = bytes(random.choice(alphabet) for _ in range(size))
+
+    with tempfile.NamedTemporaryFile(delete=False) as file:
+        file.write(data)
+        path = file.name
+
+    try:
+        for name, run in [
+            ("bytes", lambda: sum(1 for _ in searcher.finditer(data))),
+            ("memoryview", lambda: sum(1 for _ in searcher.finditer(memoryview(data)))),
+            ("mmap", lambda: sum(1 for _ in searcher.finditer_file(path))),
+        ]:
+            started = time.perf_counter()
+            found = run()
+            elapsed = time.perf_counter() - started
+            print(f"search {name}: {found} matches, {size / elapsed / (1 << 20):.1f} MB/s")
+    finally:
+        os.remove(path)
+
+
+def bench_search_scaling(sizes=(4 << 10, 16 << 10, 64 << 10, 256 << 10)):
+    # every position starts a candidate that runs to the end of the buffer
+    # and then fails, the worst case for scanning forward per candidate
+    searcher = ByteSearcher(Concatenation(KleneeStar(Symbol("a")), Symbol("b")).rex2lts().compile())
+    previous = None
+    for size in sizes:
+        data = b"a" * size
+        started = time.perf_counter()
+        assert searcher.search(data) is None
+        elapsed = time.perf_counter() - started
+        growth = "" if previous is None else f", x{elapsed / previous:.1f} over the previous size"
+        print(f"search a*b over {size} bytes of a: {elapsed:.3f}s{growth}")
+        previous = elapsed
+
+
+def bench_epsilon_closures(counts=(125, 250, 500, 1000)):
+    # every state of "a?a?...a?" reaches the rest of the automaton by
+    # epsilon edges, so storing all closures would grow with states squared
+    for count in counts:
+        pattern = parse("a?" * count)
+        tracemalloc.start()
+        lts = pattern.rex2lts()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        dfa = lts.compile()
+        elapsed = time.perf_counter() - started
+        print(f"a? x {count}: {lts.size} lts states, peak {peak >> 10} KiB building it "
+              f"({peak // lts.size} B per state), {dfa.states_count} dfa states in {elapsed:.3f}s")
+
+
+def chain_grammar(length: int) -> ContextFreeGrammar:
+    """
+    A0 -> A1 a | A1, ..., An -> a | (empty): every nonterminal only becomes
+    productive / nullable after the one below it, the worst case for
+    fixpoint iteration over all rules.
+    """
+    a = Terminal("a")
+    symbols = [NonTerminal(f"A{i}") for i in range(length + 1)]
+    rules = [GrammarRule(symbols[length], [a]), GrammarRule(symbols[length], [])]
+    for i in range(length):
+        rules.append(GrammarRule(symbols[i], [symbols[i + 1], a]))
+        rules.append(GrammarRule(symbols[i], [symbols[i + 1]]))
+
+    return ContextFreeGrammar([a], symbols, rules, symbols[0])
+
+
+def bench_grammar_cleanup():
+    for length in [1000, 2000, 4000, 8000, 16000]:
+        grammar = chain_grammar(length)
+
+        started = time.perf_counter()
+        grammar.remove_external_non_terminals()
+        cleanup = time.perf_counter() - started
+
+        started = time.perf_counter()
+        grammar.detect_disappearing_non_terminals()
+        nullable = time.perf_counter() - started
+
+        print(f"chain {length}: remove_external_non_terminals {cleanup * 1000:.1f} ms, "
+              f"detect_disappearing_non_terminals {nullable * 1000:.1f} ms")
+
+
+def nested_grammar(depth: int) -> ContextFreeGrammar:
+    """
+    C0 -> C1 b C1, ..., Cn -> a: FIRST and FOLLOW travel the whole chain,
+    one step per pass of a global fixpoint.
+    """
+    a, b = Terminal("a"), Terminal("b")
+    symbols = [NonTerminal(f"C{i}") for i in range(depth + 1)]
+    rules = [GrammarRule(symbols[depth], [a])]
+    for i in range(depth):
+        rules.append(GrammarRule(symbols[i], [symbols[i + 1], b, symbols[i + 1]]))
+
+    return ContextFreeGrammar([a, b], symbols, rules, symbols[0])
+
+
+def bench_parser_construction():
+    for depth in [500, 1000, 2000, 4000]:
+        grammar = nested_grammar(depth)
+
+        started = time.perf_counter()
+        Parser(grammar)
+        elapsed = time.perf_counter() - started
+
+        print(f"nested {depth}: Parser {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    bench_search()
+    bench_search_scaling()
+    bench_epsilon_closures()
+    bench_grammar_cleanup()
+    bench_parser_construction()
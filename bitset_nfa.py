@@ -0,0 +1,100 @@
+from typing import Dict, List, Tuple, Sequence, TYPE_CHECKING
+from matcher import StreamMatcher
+
+if TYPE_CHECKING:
+    from msp import LTS
+
+
+class BitParallelNFA:
+    """
+    Simulates an LTS with all active states packed into one int bitset.
+
+    Thompson automata from ``rex2lts`` only have labelled edges of the form
+    ``state -> state + 1``, so for every label a single mask selects the
+    states that move and a shift moves them. Any other labelled edge is kept
+    in ``jumps``. Epsilon closure of a bitset is taken byte by byte through
+    lazily filled tables instead of state by state; a byte missing from its
+    table is closed by the LTS once.
+    """
+    dead = 0
+
+    chunk_bits = 8
+    chunk_mask = (1 << chunk_bits) - 1
+
+    def __init__(self, lts: "LTS"):
+        self.lts = lts
+        self.labels: Dict[str, int] = lts.labels
+        self.final_mask = 1 << lts.end
+
+        self.shift_masks: List[int] = [0] * len(self.labels)
+        self.jumps: List[List[Tuple[int, int]]] = [list() for _ in self.labels]
+        for state in range(lts.size):
+            for edge in range(lts.offsets[state], lts.offsets[state + 1]):
+                label_id, target = lts.edge_labels[edge], lts.edge_targets[edge]
+                if label_id == lts.epsilon:
+                    continue
+                if target == state + 1:
+                    self.shift_masks[label_id] |= 1 << state
+                else:
+                    self.jumps[label_id].append((state, 1 << target))
+
+        # closed bytes are kept as (lowest state, mask shifted down to it) so
+        # that a long automaton does not store a full-width int per entry
+        self.closure_tables: List[Dict[int, Tuple[int, int]]] = [
+            dict() for _ in range(0, lts.size, BitParallelNFA.chunk_bits)
+        ]
+        self.start = self.closure(1 << lts.start)
+
+    def closure(self, mask: int) -> int:
+        result = 0
+        chunk_bits, chunk_mask = BitParallelNFA.chunk_bits, BitParallelNFA.chunk_mask
+
+        # jump straight to the lowest non-empty chunk, active sets are sparse
+        while mask:
+            chunk = ((mask & -mask).bit_length() - 1) // chunk_bits
+            first_state = chunk * chunk_bits
+            byte = mask >> first_state & chunk_mask
+            mask ^= byte << first_state
+
+            table = self.closure_tables[chunk]
+            closed = table.get(byte)
+            if closed is None:
+                states = self.lts.closure_of(first_state + bit for bit in range(chunk_bits) if byte >> bit & 1)
+                lowest = min(states)
+                closed_mask = 0
+                for state in states:
+                    closed_mask |= 1 << (state - lowest)
+                closed = (lowest, closed_mask)
+                table[byte] = closed
+            result |= closed[1] << closed[0]
+
+        return result
+
+    def step(self, mask: int, label: str) -> int:
+        label_id = self.labels.get(label)
+        if label_id is None:
+            return 0
+
+        moved = (mask & self.shift_masks[label_id]) << 1
+        for state, target_mask in self.jumps[label_id]:
+            if mask >> state & 1:
+                moved |= target_mask
+
+        return self.closure(moved)
+
+    def is_final(self, mask: int) -> bool:
+        return bool(mask & self.final_mask)
+
+    def run(self, mask: int, chain: Sequence[str]) -> int:
+        for symbol in chain:
+            if not mask:
+                break
+            mask = self.step(mask, symbol)
+
+        return mask
+
+    def accepts(self, chain: Sequence[str]) -> bool:
+        return self.is_final(self.run(self.start, chain))
+
+    def matcher(self) -> StreamMatcher:
+        return StreamMatcher(self)
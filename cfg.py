@@ -1,7 +1,8 @@
-from typing import Set, Dict, List, Sequence
+from typing import Set, Dict, List, Sequence, Optional, Tuple
 from collections import defaultdict
 from grammar_symbol import NonTerminal, Terminal, FromNonTerminal, GrammarSymbol
 from grammar_rule import GrammarRule
+from scc import strongly_connected_components
 
 
 class ContextFreeGrammar:
@@ -23,60 +24,77 @@ class ContextFreeGrammar:
         self.rules_dict = rules_dict
         self.start_non_terminal = start_non_terminal
 
-    def __get_new_alives__(self, alives: Set[NonTerminal]) -> List[NonTerminal]:
-        new_alives: List[NonTerminal] = list()
-
-        available_rules = list(filter(lambda rule:
-                                      rule.left_symbol not in alives,
-                                      self.rules, ))
-
-        for rule in available_rules:
-            not_alive_symbols = list(
-                filter(lambda symb:
-                       isinstance(symb, NonTerminal) and symb not in alives,
-                       rule.right_symbols, ))
-
-            if not not_alive_symbols:
-                new_alives.append(rule.left_symbol)
-
-        return new_alives
+    def __propagate_counters__(self, counters: List[int]) -> Set[NonTerminal]:
+        """
+        Counter-based worklist: ``counters[i]`` is the number of pending
+        right-hand nonterminal occurrences of ``self.rules[i]`` (negative if
+        the rule can never fire). A rule fires when its counter reaches zero
+        and marks its left symbol; every marked symbol decrements the rules it
+        occurs in. Each occurrence is visited once, so this is O(|grammar|).
+        """
+        occurrences: Dict[NonTerminal, List[int]] = defaultdict(list)
+        for rule_index, rule in enumerate(self.rules):
+            for symbol in rule.right_symbols:
+                if isinstance(symbol, NonTerminal):
+                    occurrences[symbol].append(rule_index)
+
+        marked: Set[NonTerminal] = set()
+        worklist: List[NonTerminal] = list()
+        for rule_index, rule in enumerate(self.rules):
+            if counters[rule_index] == 0 and rule.left_symbol not in marked:
+                marked.add(rule.left_symbol)
+                worklist.append(rule.left_symbol)
+
+        while worklist:
+            symbol = worklist.pop()
+            for rule_index in occurrences[symbol]:
+                counters[rule_index] -= 1
+                left_symbol = self.rules[rule_index].left_symbol
+                if counters[rule_index] == 0 and left_symbol not in marked:
+                    marked.add(left_symbol)
+                    worklist.append(left_symbol)
+
+        return marked
+
+    def __ordered_non_terminals__(self, selected: Set[NonTerminal]) -> List[NonTerminal]:
+        ordered = list(filter(lambda symbol: symbol in selected, self.non_terminals))
+        listed = set(ordered)
+        return ordered + [symbol for symbol in selected if symbol not in listed]
 
     def __get_alive_only_grammar__(self):
-        alives: Set[NonTerminal] = set()
-
-        while True:
-            new_alives = self.__get_new_alives__(alives)
-
-            if not new_alives:
-                break
-
-            alives.update(new_alives)
-
-        new_rules = list(filter(lambda rule: rule.left_symbol in alives, self.rules))
+        alives = self.__propagate_counters__([
+            sum(1 for symbol in rule.right_symbols if isinstance(symbol, NonTerminal))
+            for rule in self.rules
+        ])
+
+        # a rule that mentions a dead symbol can never finish a derivation
+        new_rules = list(filter(lambda rule:
+                                rule.left_symbol in alives
+                                and all(not isinstance(symbol, NonTerminal) or symbol in alives
+                                        for symbol in rule.right_symbols),
+                                self.rules, ))
 
         return ContextFreeGrammar(self.terminals,
-                                  list(alives),
+                                  self.__ordered_non_terminals__(alives),
                                   new_rules,
                                   self.start_non_terminal,
                                   )
 
     def __get_reachable_only_grammar__(self):
         reachables: Set[NonTerminal] = {self.start_non_terminal}
+        worklist: List[NonTerminal] = [self.start_non_terminal]
 
-        reachable_rules = self.rules_dict[self.start_non_terminal]
-
-        while reachable_rules:
-            rule = reachable_rules.pop()
-
-            for symbol in rule.right_symbols:
-                if isinstance(symbol, NonTerminal) and symbol not in reachables:
-                    reachables.add(symbol)
-                    reachable_rules.extend(self.rules_dict[symbol])
+        while worklist:
+            for rule in self.rules_dict.get(worklist.pop(), []):
+                for symbol in rule.right_symbols:
+                    if isinstance(symbol, NonTerminal) and symbol not in reachables:
+                        reachables.add(symbol)
+                        worklist.append(symbol)
 
         new_rules = list(filter(lambda rule: rule.left_symbol in reachables, self.rules))
 
         return ContextFreeGrammar(self.terminals,
-                                  list(reachables),
+                                  self.__ordered_non_terminals__(reachables),
                                   new_rules,
                                   self.start_non_terminal,
                                   )
@@ -103,86 +121,112 @@ class ContextFreeGrammar:
             .__get_alive_only_grammar__() \
             .__get_reachable_only_grammar__()
 
-    def __get_new_disappearing__(self, disappearing: Set[NonTerminal]) -> List[NonTerminal]:
-        new_disappearing: Set[NonTerminal] = set()
-        for rule in self.rules:
-            if rule.left_symbol in disappearing:
-                continue
-            not_disappearing_symbols = list(filter(lambda symbol: symbol not in disappearing, rule.right_symbols))
-            if not not_disappearing_symbols:
-                new_disappearing.add(rule.left_symbol)
-
-        return list(new_disappearing)
-
     def detect_disappearing_non_terminals(self) -> List[NonTerminal]:
-        disappearing: Set[NonTerminal] = set()
-
-        while True:
-            new_disappearing = self.__get_new_disappearing__(disappearing)
+        return list(self.__propagate_counters__([
+            # a terminal never disappears, so such a rule never fires
+            -1 if any(isinstance(symbol, Terminal) for symbol in rule.right_symbols) else len(rule.right_symbols)
+            for rule in self.rules
+        ]))
+
+    def __left_corner_graph__(self) -> Dict[NonTerminal, List[NonTerminal]]:
+        """
+        Edge A -> B for every rule A -> x B y where x only has disappearing
+        symbols, i.e. B can be the leftmost symbol derived from A.
+        """
+        disappearing: Set[NonTerminal] = set(self.detect_disappearing_non_terminals())
+        graph: Dict[NonTerminal, List[NonTerminal]] = defaultdict(list)
 
-            if not new_disappearing:
-                break
-
-            disappearing.update(new_disappearing)
-
-        return list(disappearing)
-
-    def detect_left_recursion(self) -> bool:
-
-        disappearing: List[NonTerminal] = self.detect_disappearing_non_terminals()
-
-        def find_most_left_non_terminals(rule: GrammarRule) -> List[NonTerminal]:
-            left_non_terminals: Set[NonTerminal] = set()
+        for rule in self.rules:
             for symbol in rule.right_symbols:
-                if symbol in disappearing:
-                    left_non_terminals.add(symbol)
-                    continue
                 if isinstance(symbol, NonTerminal):
-                    left_non_terminals.add(symbol)
-                break
-
-            return list(left_non_terminals)
-
-        enter_dict: Dict[NonTerminal, bool] = defaultdict(lambda: False)
+                    graph[rule.left_symbol].append(symbol)
+                if symbol not in disappearing:
+                    break
 
-        def dfs(cur_symb: NonTerminal) -> bool:
+        return graph
 
-            has_entered = enter_dict[cur_symb]
-            if has_entered:
-                return True
+    def left_recursive_components(self) -> List[List[NonTerminal]]:
+        """
+        Strongly connected components of the left-corner graph that contain
+        a cycle; every left-recursive nonterminal is in exactly one of them.
+        """
+        graph = self.__left_corner_graph__()
+        nodes = self.__ordered_non_terminals__(set(graph) | {self.start_non_terminal})
 
-            enter_dict[cur_symb] = True
+        return list(filter(
+            lambda component: len(component) > 1 or component[0] in graph[component[0]],
+            strongly_connected_components(nodes, lambda symbol: graph.get(symbol, [])),
+        ))
 
-            for rule in self.rules_dict[cur_symb]:
-                for next_symb in find_most_left_non_terminals(rule):
-                    if dfs(next_symb):
-                        enter_dict[cur_symb] = False
-                        return True
+    def detect_left_recursion(self) -> bool:
+        return bool(self.left_recursive_components())
+
+    def __split_nullable_runs__(self, max_nullable: int):
+        """
+        Splits every rule with more than ``max_nullable`` disappearing
+        occurrences into a chain of rules through fresh helper nonterminals,
+        each holding at most ``max_nullable`` of them (helper included).
+        """
+        if max_nullable < 2:
+            raise ValueError("max_nullable must be at least 2")
+
+        disappearing: Set[NonTerminal] = set(self.detect_disappearing_non_terminals())
+        builder = self.to_builder()
+
+        for symbol in list(builder.rules_dict):
+            kept: List[GrammarRule] = list()
+
+            for rule in builder.rules_for(symbol):
+                left_symbol, right_symbols = symbol, rule.right_symbols
+                positions = [i for i, right_symbol in enumerate(right_symbols) if right_symbol in disappearing]
+
+                while len(positions) > max_nullable:
+                    split = positions[max_nullable - 1]
+                    helper = builder.fresh_non_terminal(symbol)
+                    piece = GrammarRule(left_symbol, right_symbols[:split] + (helper,))
+                    if left_symbol is symbol:
+                        kept.append(piece)
+                    else:
+                        builder.add_rule(piece)
+
+                    left_symbol, right_symbols = helper, right_symbols[split:]
+                    positions = [position - split for position in positions[max_nullable - 1:]]
+
+                if left_symbol is symbol:
+                    kept.append(GrammarRule(left_symbol, right_symbols))
+                else:
+                    builder.add_rule(GrammarRule(left_symbol, right_symbols))
 
-            enter_dict[cur_symb] = False
-            return False
+            builder.replace_rules(symbol, kept)
 
-        return dfs(self.start_non_terminal)
+        return builder.build()
 
-    def transform_to_greibach_form(self):
+    def transform_to_greibach_form(self, max_nullable: Optional[int] = None):
+        """
+        Removes epsilon rules. A rule with k disappearing symbols expands into
+        up to 2^k rules; with ``max_nullable`` set, such rules are split first
+        (see ``__split_nullable_runs__``) so the result stays polynomial.
+        """
         clean_grammar = self
-        disappearing = clean_grammar.detect_disappearing_non_terminals()
+        if max_nullable is not None:
+            clean_grammar = clean_grammar.__split_nullable_runs__(max_nullable)
+        disappearing: Set[NonTerminal] = set(clean_grammar.detect_disappearing_non_terminals())
 
-        new_rules: Set[GrammarRule] = set(clean_grammar.rules)
+        new_rules: Dict[GrammarRule, None] = dict.fromkeys(clean_grammar.rules)
         new_start: NonTerminal = clean_grammar.start_non_terminal
         new_non_terminals: Sequence[NonTerminal] = clean_grammar.non_terminals
 
         if disappearing:
-            new_rules = set()
+            new_rules = dict()
             for rule in clean_grammar.rules:
                 new_rules \
-                    .update(rule.remove_disappearing_from_rule(disappearing))
+                    .update(dict.fromkeys(rule.remove_disappearing_from_rule(disappearing)))
 
             if clean_grammar.start_non_terminal in disappearing:
-                new_start = FromNonTerminal(new_start, str(len(clean_grammar.non_terminals)))
+                new_start = clean_grammar.to_builder().fresh_non_terminal(new_start)
 
-                new_rules.add(GrammarRule(new_start, []))
-                new_rules.add(GrammarRule(new_start, [clean_grammar.start_non_terminal]))
+                new_rules[GrammarRule(new_start, [])] = None
+                new_rules[GrammarRule(new_start, [clean_grammar.start_non_terminal])] = None
                 new_non_terminals = [new_start] + list(new_non_terminals)
 
         return ContextFreeGrammar(
@@ -192,181 +236,297 @@ class ContextFreeGrammar:
             new_start,
         )
 
-    def __remove_direct_left_recursion__(self, symbol: NonTerminal):
-        symbol_rules = self.rules_dict[symbol]
-
-        no_direct_recursion = list(
-            filter(
-                lambda rule: rule.right_symbols[0] != symbol,
-                symbol_rules,
-            )
-        )
-
-        has_direct_recursion = list(
-            filter(
-                lambda rule: rule.right_symbols[0] == symbol,
-                symbol_rules,
-            )
-        )
-        if not has_direct_recursion:
-            return self
-        new_symbol = FromNonTerminal(symbol, str(len(self.non_terminals)))
-
-        new_symbol_rules: List[GrammarRule] = list()
-        for rule in has_direct_recursion:
-            new_symbol_rules += [GrammarRule(new_symbol, rule.right_symbols[1:] + [new_symbol])]
-            new_symbol_rules += [GrammarRule(new_symbol, [])]
-
-        old_symbol_rules = list(
-            map(
-                lambda rule:
-                GrammarRule(symbol, rule.right_symbols + [new_symbol]),
-                no_direct_recursion,
-            )
-        )
-
-        old_rules = list(
-            filter(
-                lambda rule: rule.left_symbol != symbol,
-                self.rules,
-            )
-        )
-
-        return ContextFreeGrammar(
-            self.terminals,
-            list(self.non_terminals) + [new_symbol],
-            old_rules + new_symbol_rules + old_symbol_rules,
-            self.start_non_terminal
-        )
-
-    def __remove_indirect_recursion_for__(self,
-                                          lower_symbol: NonTerminal,
-                                          greater_symbol: NonTerminal,
-                                          ):
-        starts_with_lower = list(
-            filter(
-                lambda rule: rule.right_symbols and rule.right_symbols[0] == lower_symbol,
-                self.rules_dict[greater_symbol],
-            )
-        )
-
-        new_rules_for_greater: Set[GrammarRule] = set(
-            filter(
-                lambda rule: rule.right_symbols[0] != lower_symbol,
-                self.rules_dict[greater_symbol],
-            )
-        )
+    def to_chomsky_normal_form(self):
+        """
+        Rules become ``A -> B C`` or ``A -> a``; only the start symbol may
+        have an empty rule, and it is never on a right side. Long right
+        sides are split before epsilon removal, so that step stays linear.
+        """
+        grammar = self.remove_external_non_terminals()
+        builder = grammar.to_builder()
+
+        start = builder.fresh_non_terminal(grammar.start_non_terminal)
+        builder.add_rule(GrammarRule(start, [grammar.start_non_terminal]))
+        builder.start_non_terminal = start
+
+        proxies: Dict[Terminal, NonTerminal] = dict()
+        for symbol in list(builder.rules_dict):
+            new_rules: List[GrammarRule] = list()
+
+            for rule in builder.rules_for(symbol):
+                right_symbols = rule.right_symbols
+                if len(right_symbols) >= 2:
+                    right_symbols = tuple(
+                        builder.proxy_for(right_symbol, proxies) if isinstance(right_symbol, Terminal) else right_symbol
+                        for right_symbol in right_symbols
+                    )
 
-        for rule_with_lower in starts_with_lower:
-            new_rules_for_greater.update(list(
-                map(
-                    lambda rule_for_lower:
-                    GrammarRule(greater_symbol, rule_for_lower.right_symbols + rule_with_lower.right_symbols[1:]),
-                    self.rules_dict[lower_symbol],
-                )
-            ))
-
-        old_rules = set(
-            filter(
-                lambda rule: rule.left_symbol != greater_symbol,
-                self.rules,
-            )
-        )
+                left_symbol = symbol
+                while len(right_symbols) > 2:
+                    helper = builder.fresh_non_terminal(symbol)
+                    new_rule = GrammarRule(left_symbol, right_symbols[:1] + (helper,))
+                    if left_symbol is symbol:
+                        new_rules.append(new_rule)
+                    else:
+                        builder.add_rule(new_rule)
+                    left_symbol, right_symbols = helper, right_symbols[1:]
+
+                if left_symbol is symbol:
+                    new_rules.append(GrammarRule(left_symbol, right_symbols))
+                else:
+                    builder.add_rule(GrammarRule(left_symbol, right_symbols))
 
-        new_rules = old_rules
+            builder.replace_rules(symbol, new_rules)
 
-        new_rules.update(new_rules_for_greater)
+        builder = builder.build().transform_to_greibach_form().to_builder()
+        builder.remove_unit_rules()
+        return builder.build().remove_external_non_terminals()
 
-        return ContextFreeGrammar(
-            self.terminals,
-            self.non_terminals,
-            list(new_rules),
-            self.start_non_terminal,
-        )
+    def to_builder(self) -> "GrammarBuilder":
+        return GrammarBuilder(self.terminals, self.non_terminals, self.rules, self.start_non_terminal)
 
     def remove_left_recursion(self):
-        current_grammar = self
+        builder = self.to_builder()
 
-        if not current_grammar.detect_left_recursion():
-            return current_grammar
+        for component in self.left_recursive_components():
+            ordered_non_terminals = self.__ordered_non_terminals__(set(component))
+            # as before, the start symbol is the lowest in the substitution order
+            if self.start_non_terminal in ordered_non_terminals:
+                ordered_non_terminals.remove(self.start_non_terminal)
+                ordered_non_terminals.insert(0, self.start_non_terminal)
 
-        ordered_non_terminals = \
-            [current_grammar.start_non_terminal] + \
-            list(
-                filter(
-                    lambda symbol: symbol != current_grammar.start_non_terminal,
-                    current_grammar.non_terminals,
-                )
-            )
+            order = {symbol: i for i, symbol in enumerate(ordered_non_terminals)}
 
-        for i in range(len(ordered_non_terminals)):
-            greater_symbol = ordered_non_terminals[i]
+            for i in range(len(ordered_non_terminals)):
+                greater_symbol = ordered_non_terminals[i]
 
-            for j in range(i):
-                lower_symbol = ordered_non_terminals[j]
-                current_grammar = \
-                    current_grammar.__remove_indirect_recursion_for__(lower_symbol, greater_symbol)
+                # same as substituting every lower j in turn, but skips the
+                # j that no rule of greater_symbol starts with
+                while True:
+                    lower_positions = [
+                        order[rule.right_symbols[0]]
+                        for rule in builder.rules_for(greater_symbol)
+                        if rule.right_symbols and order.get(rule.right_symbols[0], i) < i
+                    ]
+                    if not lower_positions:
+                        break
+                    builder.substitute_leading(ordered_non_terminals[min(lower_positions)], greater_symbol)
 
-            current_grammar = \
-                current_grammar.__remove_direct_left_recursion__(greater_symbol)
+                builder.remove_direct_left_recursion(greater_symbol)
 
-        return current_grammar
+        return builder.build()
 
     def factorize_grammar(self):
-        clean_grammar = self
+        """
+        Left factoring in one pass per nonterminal: its alternatives go into a
+        prefix trie and every branching node below the root gets one fresh
+        nonterminal, so the longest common prefixes are factored out at once.
+        """
+        builder = self.to_builder()
+
+        for symbol in list(builder.rules_dict):
+            trie = PrefixTrie()
+            for rule in builder.rules_for(symbol):
+                trie.insert(rule.right_symbols)
+
+            builder.replace_rules(symbol, trie.factor(symbol, symbol, builder))
+
+        return builder.build()
+
+
+class PrefixTrie:
+    __slots__ = ("children", "ends")
+
+    def __init__(self):
+        self.children: Dict[GrammarSymbol, PrefixTrie] = dict()
+        self.ends = False
+
+    def insert(self, symbols: Sequence[GrammarSymbol]):
+        node = self
+        for symbol in symbols:
+            child = node.children.get(symbol)
+            if child is None:
+                child = node.children[symbol] = PrefixTrie()
+            node = child
+        node.ends = True
+
+    def factor(self,
+               origin: NonTerminal,
+               left_symbol: NonTerminal,
+               builder: "GrammarBuilder",
+               ) -> List[GrammarRule]:
+        """
+        Rules for ``left_symbol`` deriving the suffixes stored below this
+        node. Fresh symbols are named after ``origin`` and get their rules
+        added to ``builder``. Branching nodes are visited from a worklist,
+        since a trie is as deep as the longest alternative.
+        """
+        root_rules: List[GrammarRule] = list()
+        worklist: List[Tuple[PrefixTrie, NonTerminal, List[GrammarRule]]] = [(self, left_symbol, root_rules)]
+
+        while worklist:
+            trie, trie_symbol, rules = worklist.pop()
+
+            for symbol, child in trie.children.items():
+                path = [symbol]
+                node = child
+                # follow the chain until the next branching node or leaf
+                while not node.ends and len(node.children) == 1:
+                    (next_symbol, node), = node.children.items()
+                    path.append(next_symbol)
+
+                if node.children:
+                    new_symbol = builder.fresh_non_terminal(origin)
+                    rules.append(GrammarRule(trie_symbol, path + [new_symbol]))
+                    new_rules: List[GrammarRule] = list()
+                    builder.replace_rules(new_symbol, new_rules)
+                    worklist.append((node, new_symbol, new_rules))
+                else:
+                    rules.append(GrammarRule(trie_symbol, path))
 
-        factorization_set: Set[NonTerminal] = set(clean_grammar.non_terminals)
+            if trie.ends:
+                rules.append(GrammarRule(trie_symbol, []))
+            if trie is not self:
+                builder.replace_rules(trie_symbol, rules)
 
-        rules_dict: Dict[NonTerminal, List[GrammarRule]] = dict(clean_grammar.rules_dict)
+        return root_rules
 
-        new_rules: Set[GrammarRule] = set()
-        new_symbols: List[NonTerminal] = list(clean_grammar.non_terminals)
-        additional_symbols_count = len(clean_grammar.non_terminals)
 
-        def is_only_terminals(rule: GrammarRule) -> bool:
-            for symbol in rule.right_symbols:
-                if not isinstance(symbol, Terminal):
-                    return False
+class GrammarBuilder:
+    """
+    Mutable working copy of a grammar. Transformation passes replace the
+    rules of single nonterminals in place and add fresh symbols; ``build``
+    freezes the result into a ``ContextFreeGrammar`` once at the end.
+    """
 
-            return True
+    def __init__(self,
+                 terminals: Sequence[Terminal],
+                 non_terminals: Sequence[NonTerminal],
+                 rules: Sequence[GrammarRule],
+                 start_non_terminal: NonTerminal,
+                 ):
+        self.terminals = list(terminals)
+        self.non_terminals = list(non_terminals)
+        self.start_non_terminal = start_non_terminal
 
-        while factorization_set:
-            first_symb_dict: Dict[GrammarSymbol, List[GrammarRule]] = defaultdict(list)
-            current_symbol = factorization_set.pop()
-            rules_for_current = rules_dict[current_symbol]
+        self.rules_dict: Dict[NonTerminal, List[GrammarRule]] = dict()
+        for rule in rules:
+            self.rules_dict.setdefault(rule.left_symbol, []).append(rule)
+
+        # symbols are interned by name, so a fresh one needs an unused name
+        self.used_names: Set[str] = {symbol.name for symbol in self.non_terminals}
+        self.used_names.update(symbol.name for rule in rules for symbol in (rule.left_symbol,) + rule.right_symbols)
+        self.used_names.add(start_non_terminal.name)
+        self.next_suffix = len(self.non_terminals)
+
+    def rules_for(self, symbol: NonTerminal) -> List[GrammarRule]:
+        return self.rules_dict.get(symbol, [])
+
+    def replace_rules(self, symbol: NonTerminal, rules: Sequence[GrammarRule]):
+        # rules are interned, so dict.fromkeys drops duplicates in order
+        self.rules_dict[symbol] = list(dict.fromkeys(rules))
+
+    def add_rule(self, rule: GrammarRule):
+        self.rules_dict.setdefault(rule.left_symbol, []).append(rule)
+
+    def fresh_non_terminal(self, symbol: NonTerminal) -> FromNonTerminal:
+        while f"{symbol.name}({self.next_suffix})" in self.used_names:
+            self.next_suffix += 1
+        new_symbol = FromNonTerminal(symbol, str(self.next_suffix))
+        self.next_suffix += 1
+
+        self.used_names.add(new_symbol.name)
+        self.non_terminals.append(new_symbol)
+        return new_symbol
+
+    def proxy_for(self, terminal: Terminal, proxies: Dict[Terminal, NonTerminal]) -> NonTerminal:
+        """
+        The nonterminal whose only rule is ``P -> terminal``, one per
+        terminal in ``proxies``.
+        """
+        proxy = proxies.get(terminal)
+        if proxy is None:
+            proxy = proxies[terminal] = self.fresh_non_terminal(self.start_non_terminal)
+            self.add_rule(GrammarRule(proxy, [terminal]))
+        return proxy
+
+    def remove_unit_rules(self):
+        """
+        Replaces every chain ``A -> B -> .. -> C`` of single-nonterminal
+        rules by copies of the other rules of ``C`` for ``A``.
+        """
+        def unit_target(rule: GrammarRule) -> Optional[NonTerminal]:
+            if len(rule.right_symbols) == 1 and isinstance(rule.right_symbols[0], NonTerminal):
+                return rule.right_symbols[0]
+            return None
+
+        new_rules_dict: Dict[NonTerminal, List[GrammarRule]] = dict()
+        for symbol in self.rules_dict:
+            reached: Dict[NonTerminal, None] = {symbol: None}
+            worklist = [symbol]
+            while worklist:
+                for rule in self.rules_for(worklist.pop()):
+                    target = unit_target(rule)
+                    if target is not None and target not in reached:
+                        reached[target] = None
+                        worklist.append(target)
+
+            new_rules_dict[symbol] = [
+                GrammarRule(symbol, rule.right_symbols)
+                for reached_symbol in reached
+                for rule in self.rules_for(reached_symbol)
+                if unit_target(rule) is None
+            ]
+
+        for symbol, rules in new_rules_dict.items():
+            self.replace_rules(symbol, rules)
+
+    def substitute_leading(self, lower_symbol: NonTerminal, greater_symbol: NonTerminal):
+        """
+        Replaces every rule ``greater -> lower x`` by ``greater -> y x`` for
+        all rules ``lower -> y``.
+        """
+        rules_for_greater = self.rules_for(greater_symbol)
+        if not any(rule.right_symbols[:1] == (lower_symbol,) for rule in rules_for_greater):
+            return
+
+        new_rules: List[GrammarRule] = list()
+        for rule in rules_for_greater:
+            if rule.right_symbols[:1] != (lower_symbol,):
+                new_rules.append(rule)
+                continue
 
-            for rule in rules_for_current:
-                if is_only_terminals(rule) or len(rule.right_symbols) == 1:
-                    new_rules.add(rule)
-                    continue
+            for rule_for_lower in self.rules_for(lower_symbol):
+                new_rules.append(GrammarRule(greater_symbol, rule_for_lower.right_symbols + rule.right_symbols[1:]))
 
-                first_symb_dict[rule.right_symbols[0]].append(rule)
+        self.replace_rules(greater_symbol, new_rules)
 
-            for start_symbol, rules_for_symb in first_symb_dict.items():
+    def remove_direct_left_recursion(self, symbol: NonTerminal):
+        symbol_rules = self.rules_for(symbol)
 
-                if len(rules_for_symb) > 1:
-                    new_symb = FromNonTerminal(current_symbol, f"{additional_symbols_count}")
+        has_direct_recursion = list(filter(lambda rule: rule.right_symbols[:1] == (symbol,), symbol_rules))
+        if not has_direct_recursion:
+            return
+        no_direct_recursion = list(filter(lambda rule: rule.right_symbols[:1] != (symbol,), symbol_rules))
 
-                    rules_dict[new_symb] = list(
-                        map(
-                            lambda rule: GrammarRule(new_symb, rule.right_symbols[1:]),
-                            rules_for_symb,
-                        )
-                    )
-                    new_symbols.append(new_symb)
-                    new_rules.add(GrammarRule(current_symbol, [start_symbol, new_symb]))
+        new_symbol = self.fresh_non_terminal(symbol)
 
-                    factorization_set.add(new_symb)
-                    additional_symbols_count += 1
-                else:
-                    if rules_for_symb:
-                        new_rules.update(rules_for_symb)
+        self.replace_rules(
+            new_symbol,
+            [GrammarRule(new_symbol, rule.right_symbols[1:] + (new_symbol,)) for rule in has_direct_recursion]
+            + [GrammarRule(new_symbol, [])],
+        )
+        self.replace_rules(
+            symbol,
+            [GrammarRule(symbol, rule.right_symbols + (new_symbol,)) for rule in no_direct_recursion],
+        )
 
+    def build(self) -> ContextFreeGrammar:
         return ContextFreeGrammar(
-            clean_grammar.terminals,
-            new_symbols,
-            list(new_rules),
-            clean_grammar.start_non_terminal,
+            list(self.terminals),
+            list(self.non_terminals),
+            [rule for rules in self.rules_dict.values() for rule in rules],
+            self.start_non_terminal,
         )
 
 
@@ -0,0 +1,329 @@
+from typing import Dict, List, Set, Optional
+from array import array
+from cfg import ContextFreeGrammar
+from grammar_symbol import NonTerminal, Terminal, GrammarSymbol
+from grammar_rule import GrammarRule
+
+
+class CompactGrammar:
+    """
+    Array-encoded context-free grammar.
+
+    Nonterminal ``k`` is encoded as ``k`` and terminal ``t`` as ``~t``, so the
+    sign tells them apart. Rules are sorted by left symbol: the right-hand
+    side of rule ``r`` is ``rhs[rhs_offsets[r]:rhs_offsets[r + 1]]`` and the
+    rules of nonterminal ``k`` are ``left_offsets[k]`` to
+    ``left_offsets[k + 1] - 1``. FIRST/FOLLOW are int bitsets over terminal
+    indices, FOLLOW uses bit ``len(terminals)`` for the end marker.
+    """
+    # the same (interned) terminals Parser uses as epsilon and end marker
+    epsilon = Terminal("epsilon")
+    end_symbol = Terminal("$")
+
+    def __init__(self,
+                 terminals: List[Terminal],
+                 non_terminals: List[NonTerminal],
+                 rule_left: array,
+                 rhs: array,
+                 rhs_offsets: array,
+                 start: int,
+                 ):
+        self.terminals = terminals
+        self.non_terminals = non_terminals
+        self.rule_left = rule_left
+        self.rhs = rhs
+        self.rhs_offsets = rhs_offsets
+        self.start = start
+
+        self.left_offsets = array("i", [0] * (len(non_terminals) + 1))
+        for left in rule_left:
+            self.left_offsets[left + 1] += 1
+        for non_terminal in range(len(non_terminals)):
+            self.left_offsets[non_terminal + 1] += self.left_offsets[non_terminal]
+
+        self.occurrence_offsets: Optional[array] = None
+        self.occurrence_rules: Optional[array] = None
+
+    @property
+    def rules_count(self) -> int:
+        return len(self.rule_left)
+
+    @staticmethod
+    def from_grammar(grammar: ContextFreeGrammar) -> "CompactGrammar":
+        terminal_ids: Dict[GrammarSymbol, int] = dict()
+        non_terminal_ids: Dict[GrammarSymbol, int] = dict()
+
+        def encode(symbol: GrammarSymbol) -> int:
+            if isinstance(symbol, Terminal):
+                return ~terminal_ids.setdefault(symbol, len(terminal_ids))
+            return non_terminal_ids.setdefault(symbol, len(non_terminal_ids))
+
+        for terminal in grammar.terminals:
+            encode(terminal)
+        for non_terminal in grammar.non_terminals:
+            encode(non_terminal)
+        start = encode(grammar.start_non_terminal)
+
+        rules = sorted(grammar.rules, key=lambda rule: encode(rule.left_symbol))
+        rule_left = array("i", [encode(rule.left_symbol) for rule in rules])
+        rhs = array("i")
+        rhs_offsets = array("i", [0])
+        for rule in rules:
+            rhs.extend(encode(symbol) for symbol in rule.right_symbols)
+            rhs_offsets.append(len(rhs))
+
+        return CompactGrammar(list(terminal_ids),
+                              list(non_terminal_ids),
+                              rule_left,
+                              rhs,
+                              rhs_offsets,
+                              start,
+                              )
+
+    def decode(self, symbol: int) -> GrammarSymbol:
+        return self.non_terminals[symbol] if symbol >= 0 else self.terminals[~symbol]
+
+    def to_grammar(self) -> ContextFreeGrammar:
+        rules = [
+            GrammarRule(self.non_terminals[self.rule_left[rule]],
+                        [self.decode(symbol) for symbol in self.rhs[self.rhs_offsets[rule]:self.rhs_offsets[rule + 1]]])
+            for rule in range(self.rules_count)
+        ]
+
+        return ContextFreeGrammar(list(self.terminals),
+                                  list(self.non_terminals),
+                                  rules,
+                                  self.non_terminals[self.start],
+                                  )
+
+    def __create_occurrences__(self):
+        """
+        Reverse index: the rules in which nonterminal ``k`` occurs on the
+        right, once per occurrence.
+        """
+        counts = [0] * (len(self.non_terminals) + 1)
+        for symbol in self.rhs:
+            if symbol >= 0:
+                counts[symbol + 1] += 1
+        for non_terminal in range(len(self.non_terminals)):
+            counts[non_terminal + 1] += counts[non_terminal]
+
+        self.occurrence_offsets = array("i", counts)
+        self.occurrence_rules = array("i", [0] * counts[-1])
+        filled = counts[:-1]
+        for rule in range(self.rules_count):
+            for position in range(self.rhs_offsets[rule], self.rhs_offsets[rule + 1]):
+                symbol = self.rhs[position]
+                if symbol >= 0:
+                    self.occurrence_rules[filled[symbol]] = rule
+                    filled[symbol] += 1
+
+    def __propagate_counters__(self, counters: List[int]) -> bytearray:
+        """
+        Counter-based worklist: a rule fires once its counter drops to zero,
+        marking its left symbol; every marked nonterminal decrements the
+        counters of the rules it occurs in. Each occurrence is seen once.
+        """
+        if self.occurrence_offsets is None:
+            self.__create_occurrences__()
+
+        marked = bytearray(len(self.non_terminals))
+        worklist: List[int] = list()
+        for rule in range(self.rules_count):
+            if counters[rule] == 0 and not marked[self.rule_left[rule]]:
+                marked[self.rule_left[rule]] = 1
+                worklist.append(self.rule_left[rule])
+
+        while worklist:
+            non_terminal = worklist.pop()
+            for index in range(self.occurrence_offsets[non_terminal], self.occurrence_offsets[non_terminal + 1]):
+                rule = self.occurrence_rules[index]
+                counters[rule] -= 1
+                if counters[rule] == 0 and not marked[self.rule_left[rule]]:
+                    marked[self.rule_left[rule]] = 1
+                    worklist.append(self.rule_left[rule])
+
+        return marked
+
+    def nullable(self) -> bytearray:
+        counters: List[int] = list()
+        for rule in range(self.rules_count):
+            symbols = self.rhs[self.rhs_offsets[rule]:self.rhs_offsets[rule + 1]]
+            # a terminal can never vanish, so such a rule never fires
+            counters.append(-1 if any(symbol < 0 for symbol in symbols) else len(symbols))
+        return self.__propagate_counters__(counters)
+
+    def productive(self) -> bytearray:
+        counters = [
+            sum(1 for symbol in self.rhs[self.rhs_offsets[rule]:self.rhs_offsets[rule + 1]] if symbol >= 0)
+            for rule in range(self.rules_count)
+        ]
+        return self.__propagate_counters__(counters)
+
+    def reachable(self, allowed: Optional[bytearray] = None) -> bytearray:
+        """
+        Nonterminals reachable from the start through rules whose symbols
+        all pass ``allowed`` (every nonterminal when it is ``None``).
+        """
+        def is_usable(rule: int) -> bool:
+            return allowed is None or all(
+                symbol < 0 or allowed[symbol]
+                for symbol in self.rhs[self.rhs_offsets[rule]:self.rhs_offsets[rule + 1]]
+            )
+
+        reached = bytearray(len(self.non_terminals))
+        if allowed is not None and not allowed[self.start]:
+            return reached
+
+        reached[self.start] = 1
+        worklist = [self.start]
+        while worklist:
+            non_terminal = worklist.pop()
+            for rule in range(self.left_offsets[non_terminal], self.left_offsets[non_terminal + 1]):
+                if not is_usable(rule):
+                    continue
+                for position in range(self.rhs_offsets[rule], self.rhs_offsets[rule + 1]):
+                    symbol = self.rhs[position]
+                    if symbol >= 0 and not reached[symbol]:
+                        reached[symbol] = 1
+                        worklist.append(symbol)
+        return reached
+
+    def detect_disappearing_non_terminals(self) -> List[NonTerminal]:
+        return [self.non_terminals[k] for k, is_nullable in enumerate(self.nullable()) if is_nullable]
+
+    def remove_external_non_terminals(self) -> "CompactGrammar":
+        productive = self.productive()
+        useful = self.reachable(productive)
+
+        new_ids = array("i", [-1] * len(self.non_terminals))
+        non_terminals: List[NonTerminal] = list()
+        for non_terminal, is_useful in enumerate(useful):
+            if is_useful:
+                new_ids[non_terminal] = len(non_terminals)
+                non_terminals.append(self.non_terminals[non_terminal])
+
+        rule_left, rhs, rhs_offsets = array("i"), array("i"), array("i", [0])
+        for rule in range(self.rules_count):
+            symbols = self.rhs[self.rhs_offsets[rule]:self.rhs_offsets[rule + 1]]
+            if not useful[self.rule_left[rule]] or any(symbol >= 0 and not useful[symbol] for symbol in symbols):
+                continue
+            rule_left.append(new_ids[self.rule_left[rule]])
+            rhs.extend(symbol if symbol < 0 else new_ids[symbol] for symbol in symbols)
+            rhs_offsets.append(len(rhs))
+
+        # keep the start symbol even if the language is empty
+        if not useful[self.start]:
+            non_terminals.append(self.non_terminals[self.start])
+            new_ids[self.start] = len(non_terminals) - 1
+
+        return CompactGrammar(list(self.terminals),
+                              non_terminals,
+                              rule_left,
+                              rhs,
+                              rhs_offsets,
+                              new_ids[self.start],
+                              )
+
+    def first_bitsets(self, nullable: Optional[bytearray] = None) -> List[int]:
+        if nullable is None:
+            nullable = self.nullable()
+
+        first = [0] * len(self.non_terminals)
+        # dependants[b] lists the nonterminals whose FIRST includes FIRST(b)
+        dependants: List[List[int]] = [list() for _ in self.non_terminals]
+
+        for rule in range(self.rules_count):
+            left = self.rule_left[rule]
+            for position in range(self.rhs_offsets[rule], self.rhs_offsets[rule + 1]):
+                symbol = self.rhs[position]
+                if symbol < 0:
+                    first[left] |= 1 << ~symbol
+                    break
+                if symbol != left:
+                    dependants[symbol].append(left)
+                if not nullable[symbol]:
+                    break
+
+        worklist = list(range(len(self.non_terminals)))
+        while worklist:
+            non_terminal = worklist.pop()
+            for dependant in dependants[non_terminal]:
+                merged = first[dependant] | first[non_terminal]
+                if merged != first[dependant]:
+                    first[dependant] = merged
+                    worklist.append(dependant)
+
+        return first
+
+    def follow_bitsets(self, nullable: Optional[bytearray] = None, first: Optional[List[int]] = None) -> List[int]:
+        if nullable is None:
+            nullable = self.nullable()
+        if first is None:
+            first = self.first_bitsets(nullable)
+
+        follow = [0] * len(self.non_terminals)
+        follow[self.start] |= 1 << len(self.terminals)
+        # dependants[a] lists the nonterminals whose FOLLOW includes FOLLOW(a)
+        dependants: List[List[int]] = [list() for _ in self.non_terminals]
+
+        for rule in range(self.rules_count):
+            left = self.rule_left[rule]
+            suffix_first = 0
+            suffix_nullable = True
+
+            for position in reversed(range(self.rhs_offsets[rule], self.rhs_offsets[rule + 1])):
+                symbol = self.rhs[position]
+                if symbol < 0:
+                    suffix_first, suffix_nullable = 1 << ~symbol, False
+                    continue
+
+                follow[symbol] |= suffix_first
+                if suffix_nullable and symbol != left:
+                    dependants[left].append(symbol)
+
+                if nullable[symbol]:
+                    suffix_first |= first[symbol]
+                else:
+                    suffix_first, suffix_nullable = first[symbol], False
+
+        worklist = list(range(len(self.non_terminals)))
+        while worklist:
+            non_terminal = worklist.pop()
+            for dependant in dependants[non_terminal]:
+                merged = follow[dependant] | follow[non_terminal]
+                if merged != follow[dependant]:
+                    follow[dependant] = merged
+                    worklist.append(dependant)
+
+        return follow
+
+    def __bits_to_terminals__(self, bits: int) -> Set[Terminal]:
+        result: Set[Terminal] = set()
+        while bits:
+            low = bits & -bits
+            index = low.bit_length() - 1
+            result.add(self.terminals[index] if index < len(self.terminals) else CompactGrammar.end_symbol)
+            bits ^= low
+        return result
+
+    def first_sets(self) -> Dict[NonTerminal, Set[Terminal]]:
+        """
+        FIRST of every nonterminal, with ``epsilon`` for nullable ones.
+        """
+        nullable = self.nullable()
+        result: Dict[NonTerminal, Set[Terminal]] = dict()
+        for non_terminal, bits in enumerate(self.first_bitsets(nullable)):
+            result[self.non_terminals[non_terminal]] = self.__bits_to_terminals__(bits)
+            if nullable[non_terminal]:
+                result[self.non_terminals[non_terminal]].add(CompactGrammar.epsilon)
+        return result
+
+    def follow_sets(self) -> Dict[NonTerminal, Set[Terminal]]:
+        """
+        FOLLOW of every nonterminal, with ``$`` for the end of input.
+        """
+        return {
+            self.non_terminals[non_terminal]: self.__bits_to_terminals__(bits)
+            for non_terminal, bits in enumerate(self.follow_bitsets())
+        }
@@ -0,0 +1,67 @@
+from typing import Dict, List, Sequence, Tuple
+from cfg import ContextFreeGrammar
+from grammar_symbol import NonTerminal, Terminal
+
+
+class CYKRecognizer:
+    """
+    CYK over ``to_chomsky_normal_form()`` of a grammar, in bit-vector form.
+
+    For every nonterminal ``X`` the chart keeps ``ends[X][i]``, the set of
+    ``j`` with ``X => word[i:j]``, and ``starts[X][j]``, the set of such
+    ``i``, both as int bitsets over input positions. ``A -> B C`` then
+    covers ``word[i:j]`` iff ``ends[B][i] & starts[C][j]`` is not empty, one
+    and over all split points at once, so a sentence costs
+    O(n^2 * |rules|) word-parallel operations.
+    """
+
+    def __init__(self, grammar: ContextFreeGrammar):
+        self.grammar = grammar.to_chomsky_normal_form()
+        self.non_terminals: List[NonTerminal] = list(dict.fromkeys(
+            [self.grammar.start_non_terminal] + [rule.left_symbol for rule in self.grammar.rules]))
+        index = {symbol: position for position, symbol in enumerate(self.non_terminals)}
+
+        self.terminals_by_name: Dict[str, Terminal] = {terminal.name: terminal for terminal in self.grammar.terminals}
+        self.producers: Dict[Terminal, List[int]] = dict()
+        # binary[a] lists (b, c) for every rule A -> B C
+        self.binary: List[List[Tuple[int, int]]] = [list() for _ in self.non_terminals]
+        self.accepts_empty = False
+
+        for rule in self.grammar.rules:
+            left = index[rule.left_symbol]
+            if not rule.right_symbols:
+                self.accepts_empty = True
+            elif len(rule.right_symbols) == 1:
+                self.producers.setdefault(rule.right_symbols[0], []).append(left)
+            else:
+                first, second = rule.right_symbols
+                self.binary[left].append((index[first], index[second]))
+
+    def recognize(self, word: Sequence[str]) -> bool:
+        if not word:
+            return self.accepts_empty
+
+        length = len(word)
+        ends = [[0] * (length + 1) for _ in self.non_terminals]
+        starts = [[0] * (length + 1) for _ in self.non_terminals]
+
+        for position, name in enumerate(word):
+            token = self.terminals_by_name.get(name)
+            if token is None:
+                return False
+            for left in self.producers.get(token, ()):
+                ends[left][position] |= 1 << (position + 1)
+                starts[left][position + 1] |= 1 << position
+
+        binary = [(left, pairs) for left, pairs in enumerate(self.binary) if pairs]
+        for span in range(2, length + 1):
+            for begin in range(length - span + 1):
+                end = begin + span
+                for left, pairs in binary:
+                    for first, second in pairs:
+                        if ends[first][begin] & starts[second][end]:
+                            ends[left][begin] |= 1 << end
+                            starts[left][end] |= 1 << begin
+                            break
+
+        return bool(ends[0][0] >> length & 1)
@@ -0,0 +1,277 @@
+from typing import Dict, List, Optional, Set, Sequence, FrozenSet, TYPE_CHECKING
+from array import array
+from matcher import StreamMatcher
+
+if TYPE_CHECKING:
+    from msp import LTS
+
+
+class DFA:
+    """
+    Deterministic automaton with a dense transition table.
+
+    Row ``state`` of ``table`` holds ``len(labels)`` entries, one per label id;
+    a negative entry means the transition leads to the (implicit) dead state.
+    A DFA returned by ``minimize`` keeps the state count it was reduced from
+    in ``minimized_from``; it is None for any other DFA.
+    """
+    dead = -1
+
+    def __init__(self,
+                 start: int,
+                 labels: Dict[str, int],
+                 table: array,
+                 finals: List[bool],
+                 ):
+        self.start = start
+        self.labels = labels
+        self.table = table
+        self.finals = finals
+        self.minimized_from: Optional[int] = None
+
+    @property
+    def states_count(self) -> int:
+        return len(self.finals)
+
+    def step(self, state: int, label: str) -> int:
+        label_id = self.labels.get(label)
+        if label_id is None or state < 0:
+            return DFA.dead
+        return self.table[state * len(self.labels) + label_id]
+
+    def is_final(self, state: int) -> bool:
+        return state >= 0 and self.finals[state]
+
+    def run(self, state: int, chain: Sequence[str]) -> int:
+        labels, table, width = self.labels, self.table, len(self.labels)
+
+        for symbol in chain:
+            label_id = labels.get(symbol)
+            if label_id is None or state < 0:
+                return DFA.dead
+
+            state = table[state * width + label_id]
+
+        return state
+
+    def accepts(self, chain: Sequence[str]) -> bool:
+        return self.is_final(self.run(self.start, chain))
+
+    def matcher(self) -> StreamMatcher:
+        return StreamMatcher(self)
+
+    def minimize(self) -> "DFA":
+        """
+        Hopcroft partition refinement. The dead state is made explicit as
+        ``sink`` while refining and dropped again from the result.
+        """
+        width = len(self.labels)
+        sink = self.states_count
+        total = sink + 1
+
+        inverse: List[List[List[int]]] = [[[] for _ in range(total)] for _ in range(width)]
+        for state in range(sink):
+            for label_id in range(width):
+                target = self.table[state * width + label_id]
+                inverse[label_id][sink if target < 0 else target].append(state)
+        for label_id in range(width):
+            inverse[label_id][sink].append(sink)
+
+        finals = {state for state in range(sink) if self.finals[state]}
+        others = set(range(total)) - finals
+        blocks: List[Set[int]] = [block for block in (finals, others) if block]
+
+        block_of: List[int] = [0] * total
+        for block_id, block in enumerate(blocks):
+            for state in block:
+                block_of[state] = block_id
+
+        waiting: Set[int] = set(range(len(blocks)))
+        while waiting:
+            splitter = list(blocks[waiting.pop()])
+
+            for label_id in range(width):
+                touched: Dict[int, List[int]] = dict()
+                for target in splitter:
+                    for source in inverse[label_id][target]:
+                        touched.setdefault(block_of[source], []).append(source)
+
+                for block_id, members in touched.items():
+                    block = blocks[block_id]
+                    if len(members) == len(block):
+                        continue
+
+                    new_block = set(members)
+                    block -= new_block
+                    new_id = len(blocks)
+                    blocks.append(new_block)
+                    for state in new_block:
+                        block_of[state] = new_id
+
+                    if block_id in waiting:
+                        waiting.add(new_id)
+                    else:
+                        waiting.add(block_id if len(block) < len(new_block) else new_id)
+
+        # renumber the surviving blocks in BFS order from the start block;
+        # min() never picks the sink, which has the largest index
+        dead_block = block_of[sink]
+        new_ids: Dict[int, int] = {block_of[self.start]: 0}
+        order: List[int] = [block_of[self.start]]
+        table = array("i")
+
+        current = 0
+        while current < len(order):
+            representative = min(blocks[order[current]])
+            current += 1
+
+            for label_id in range(width):
+                target = self.table[representative * width + label_id]
+                target_block = dead_block if target < 0 else block_of[target]
+
+                if target_block == dead_block:
+                    table.append(DFA.dead)
+                    continue
+
+                if target_block not in new_ids:
+                    new_ids[target_block] = len(order)
+                    order.append(target_block)
+                table.append(new_ids[target_block])
+
+        minimal = DFA(0,
+                      dict(self.labels),
+                      table,
+                      [self.finals[min(blocks[block_id])] for block_id in order],
+                      )
+        minimal.minimized_from = self.states_count
+        return minimal
+
+
+class LazyDFA:
+    """
+    DFA whose states are built from ``lts`` on demand while matching.
+
+    At most ``max_states`` states are kept; when the cache is full it is
+    flushed and rebuilt from the state being stepped from, so memory stays
+    bounded even for patterns whose full DFA would be exponential.
+    """
+    dead = DFA.dead
+    unknown = -2
+
+    def __init__(self, lts: "LTS", max_states: int = 1024):
+        # after a flush the start, current and target states must fit
+        if max_states < 3:
+            raise ValueError("lazy DFA needs room for at least three states")
+
+        self.lts = lts
+        self.max_states = max_states
+        self.labels: Dict[str, int] = lts.labels
+        self.start_set = frozenset(lts.closure(lts.start))
+
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        # bumped on every flush; state ids from an older generation are stale
+        self.generation = 0
+
+        self.__flush__()
+        self.flushes = 0
+
+    @property
+    def states_count(self) -> int:
+        return len(self.state_sets)
+
+    def __flush__(self):
+        self.set_ids: Dict[FrozenSet[int], int] = dict()
+        self.state_sets: List[FrozenSet[int]] = list()
+        self.finals: List[bool] = list()
+        self.table: List[int] = list()
+        self.flushes += 1
+        self.generation += 1
+
+        self.start = self.__add_state__(self.start_set)
+
+    def __add_state__(self, state_set: FrozenSet[int]) -> int:
+        state = len(self.state_sets)
+        self.set_ids[state_set] = state
+        self.state_sets.append(state_set)
+        self.finals.append(self.lts.end in state_set)
+        self.table.extend([LazyDFA.unknown] * len(self.labels))
+        return state
+
+    def __compute_step__(self, state: int, label_id: int) -> int:
+        self.misses += 1
+        current_set = self.state_sets[state]
+        target_set = self.lts.__move__(current_set, label_id)
+
+        if not target_set:
+            self.table[state * len(self.labels) + label_id] = DFA.dead
+            return DFA.dead
+
+        target = self.set_ids.get(target_set)
+
+        if target is None:
+            if len(self.state_sets) >= self.max_states:
+                self.__flush__()
+                state = self.set_ids.get(current_set)
+                if state is None:
+                    state = self.__add_state__(current_set)
+
+            target = self.set_ids.get(target_set)
+            if target is None:
+                target = self.__add_state__(target_set)
+
+        self.table[state * len(self.labels) + label_id] = target
+        return target
+
+    def intern(self, state_set: FrozenSet[int]) -> int:
+        """
+        Id of the state for ``state_set`` in the current generation; used to
+        get back a state whose id went stale with a flush.
+        """
+        state = self.set_ids.get(state_set)
+        if state is None:
+            if len(self.state_sets) >= self.max_states:
+                self.__flush__()
+                state = self.set_ids.get(state_set)
+            if state is None:
+                state = self.__add_state__(state_set)
+        return state
+
+    def step(self, state: int, label: str) -> int:
+        label_id = self.labels.get(label)
+        if label_id is None or state < 0:
+            return DFA.dead
+
+        target = self.table[state * len(self.labels) + label_id]
+        if target != LazyDFA.unknown:
+            self.hits += 1
+            return target
+
+        return self.__compute_step__(state, label_id)
+
+    def is_final(self, state: int) -> bool:
+        return state >= 0 and self.finals[state]
+
+    def run(self, state: int, chain: Sequence[str]) -> int:
+        labels, width = self.labels, len(self.labels)
+
+        for symbol in chain:
+            label_id = labels.get(symbol)
+            if label_id is None or state < 0:
+                return DFA.dead
+
+            target = self.table[state * width + label_id]
+            if target == LazyDFA.unknown:
+                target = self.__compute_step__(state, label_id)
+            else:
+                self.hits += 1
+            state = target
+
+        return state
+
+    def accepts(self, chain: Sequence[str]) -> bool:
+        return self.is_final(self.run(self.start, chain))
+
+    def matcher(self) -> StreamMatcher:
+        return StreamMatcher(self)
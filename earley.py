@@ -0,0 +1,148 @@
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from collections import defaultdict
+from cfg import ContextFreeGrammar
+from grammar_symbol import GrammarSymbol, NonTerminal, Terminal
+
+# (dotted rule, origin set)
+Item = Tuple[int, int]
+
+
+class EarleyRecognizer:
+    """
+    Earley recognizer over the grammar as written: left recursion, nullable
+    symbols and ambiguity need no transformation. O(n^3) in general, linear
+    for LR-regular grammars.
+
+    Dotted rules are numbered densely: rule ``A -> X1 .. Xn`` owns the ids
+    ``offset .. offset + n``, the dot sitting before ``X(i+1)`` for id
+    ``offset + i``. Id 0 is the added rule ``-> S`` whose completion means
+    acceptance.
+
+    Nullable symbols are stepped over while predicting (Aycock-Horspool),
+    and right-recursive chains of completions are shortcut by Leo's
+    transitive items, so each set holds one item per chain.
+    """
+    accept = 1
+
+    def __init__(self, grammar: ContextFreeGrammar):
+        self.grammar = grammar
+        self.terminals_by_name: Dict[str, Terminal] = {terminal.name: terminal for terminal in grammar.terminals}
+        self.nullable: Set[NonTerminal] = set(grammar.detect_disappearing_non_terminals())
+
+        self.next_symbol: List[Optional[GrammarSymbol]] = list()
+        self.left_symbol: List[Optional[NonTerminal]] = list()
+        self.predictions: Dict[NonTerminal, List[int]] = defaultdict(list)
+
+        rules = [(None, (grammar.start_non_terminal,))]
+        rules += [(rule.left_symbol, rule.right_symbols) for rule in grammar.rules]
+        for left_symbol, right_symbols in rules:
+            if left_symbol is not None:
+                self.predictions[left_symbol].append(len(self.next_symbol))
+            for symbol in right_symbols:
+                self.next_symbol.append(symbol)
+                self.left_symbol.append(left_symbol)
+            self.next_symbol.append(None)
+            self.left_symbol.append(left_symbol)
+
+    def __leo_item__(self,
+                     postdot: List[Dict[GrammarSymbol, List[Item]]],
+                     leo: List[Dict[NonTerminal, Optional[Item]]],
+                     origin: int,
+                     symbol: NonTerminal,
+                     ) -> Optional[Item]:
+        """
+        The topmost item of the deterministic chain that completing
+        ``symbol`` from ``origin`` starts, if set ``origin`` has exactly one
+        item waiting for ``symbol`` and ``symbol`` ends its rule.
+        """
+        next_symbol, left_symbol = self.next_symbol, self.left_symbol
+        chain: List[Tuple[int, NonTerminal, Item]] = list()
+        top: Optional[Item] = None
+
+        while symbol is not None:
+            if symbol in leo[origin]:
+                top = leo[origin][symbol]
+                break
+
+            waiting = postdot[origin].get(symbol)
+            if waiting is None or len(waiting) != 1 or next_symbol[waiting[0][0] + 1] is not None:
+                leo[origin][symbol] = None
+                break
+
+            dotted, parent_origin = waiting[0]
+            chain.append((origin, symbol, (dotted + 1, parent_origin)))
+            origin, symbol = parent_origin, left_symbol[dotted]
+
+        for origin, symbol, item in reversed(chain):
+            if top is None:
+                top = item
+            leo[origin][symbol] = top
+
+        return top
+
+    def recognize(self, word: Sequence[str]) -> bool:
+        tokens: List[Terminal] = list()
+        for name in word:
+            token = self.terminals_by_name.get(name)
+            if token is None:
+                return False
+            tokens.append(token)
+
+        next_symbol, left_symbol = self.next_symbol, self.left_symbol
+        predictions, nullable = self.predictions, self.nullable
+
+        sets: List[Dict[Item, None]] = [dict() for _ in range(len(tokens) + 1)]
+        postdot: List[Dict[GrammarSymbol, List[Item]]] = [dict() for _ in range(len(tokens) + 1)]
+        leo: List[Dict[NonTerminal, Optional[Item]]] = [dict() for _ in range(len(tokens) + 1)]
+
+        def add(position: int, item: Item, worklist: List[Item]):
+            if item in sets[position]:
+                return
+            sets[position][item] = None
+            worklist.append(item)
+            symbol = next_symbol[item[0]]
+            if symbol is not None:
+                postdot[position].setdefault(symbol, []).append(item)
+
+        add(0, (0, 0), [])
+
+        for position in range(len(tokens) + 1):
+            worklist = list(sets[position])
+            predicted: Set[NonTerminal] = set()
+
+            while worklist:
+                dotted, origin = worklist.pop()
+                symbol = next_symbol[dotted]
+
+                if symbol is None:
+                    completed = left_symbol[dotted]
+                    if completed is None:
+                        continue
+                    if origin < position:
+                        top = self.__leo_item__(postdot, leo, origin, completed)
+                        if top is not None:
+                            add(position, top, worklist)
+                            continue
+                    # items of this set waiting for an empty ``completed`` may
+                    # still come; they step over it when predicting it
+                    for parent_dotted, parent_origin in list(postdot[origin].get(completed, ())):
+                        add(position, (parent_dotted + 1, parent_origin), worklist)
+
+                elif isinstance(symbol, NonTerminal):
+                    if symbol not in predicted:
+                        predicted.add(symbol)
+                        for predicted_dotted in predictions[symbol]:
+                            add(position, (predicted_dotted, position), worklist)
+                    if symbol in nullable:
+                        add(position, (dotted + 1, origin), worklist)
+
+            if position == len(tokens):
+                break
+
+            scanned: List[Item] = list()
+            for dotted, origin in postdot[position].get(tokens[position], ()):
+                add(position + 1, (dotted + 1, origin), scanned)
+            if not scanned:
+                return False
+
+        return (EarleyRecognizer.accept, 0) in sets[len(tokens)]
@@ -1,11 +1,42 @@
-from typing import List, Sequence
+from typing import List, Sequence, Tuple, Collection
+from threading import Lock
+from weakref import WeakValueDictionary
 from grammar_symbol import GrammarSymbol, NonTerminal, Terminal
 
 
 class GrammarRule:
-    def __init__(self, left_symbol: NonTerminal, right_symbols: List[GrammarSymbol]):
-        self.left_symbol = left_symbol
-        self.right_symbols = right_symbols
+    """
+    Immutable rule with a tuple right-hand side. Rules are pooled, so
+    building an existing rule again returns the same object; the pool holds
+    them weakly and drops rules no grammar refers to any more. Lookup and
+    insertion happen under ``pool_lock``, so racing threads share one rule.
+    """
+    __slots__ = ("left_symbol", "right_symbols", "hash", "__weakref__")
+
+    rule_pool: "WeakValueDictionary[Tuple[NonTerminal, Tuple[GrammarSymbol, ...]], GrammarRule]" = \
+        WeakValueDictionary()
+    pool_lock = Lock()
+
+    def __new__(cls, left_symbol: NonTerminal, right_symbols: Sequence[GrammarSymbol]):
+        right_symbols = tuple(right_symbols)
+        key = (left_symbol, right_symbols)
+
+        with GrammarRule.pool_lock:
+            rule = GrammarRule.rule_pool.get(key)
+            if rule is None:
+                rule = super().__new__(cls)
+                object.__setattr__(rule, "left_symbol", left_symbol)
+                object.__setattr__(rule, "right_symbols", right_symbols)
+                object.__setattr__(rule, "hash", hash(key))
+                GrammarRule.rule_pool[key] = rule
+
+        return rule
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return type(self), (self.left_symbol, self.right_symbols)
 
     def __str__(self):
         right_str = ""
@@ -15,18 +46,16 @@ class GrammarRule:
         return f"{self.left_symbol} ->{right_str}"
 
     def __eq__(self, other):
-        return type(other) is type(self) \
-               and self.left_symbol == other.left_symbol \
-               and self.right_symbols == other.right_symbols
+        return self is other
 
     def __hash__(self):
-        return len(self.left_symbol.name) + len(self.right_symbols)
+        return self.hash
 
-    def remove_disappearing_from_rule(self, disappearing: Sequence[NonTerminal]) :
+    def remove_disappearing_from_rule(self, disappearing: Collection[NonTerminal]):
 
         def remove_disappearing_from_list(
-                right_symbols: List[GrammarSymbol],
-        ) -> List[List[GrammarSymbol]]:
+                right_symbols: Tuple[GrammarSymbol, ...],
+        ) -> List[Tuple[GrammarSymbol, ...]]:
             i = 0
             for symbol in right_symbols:
                 i += 1
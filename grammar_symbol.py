@@ -1,29 +1,82 @@
+from typing import Dict, List, Tuple
+from threading import Lock
+
+
 class GrammarSymbol:
-    def __init__(self, name: str):
-        self.name = name
+    """
+    Symbols are interned per (class, name): building the same symbol twice
+    returns the same object, so equality is identity and the hash is the
+    dense ``id`` handed out on first use. ``by_id`` maps ids back.
+
+    A symbol is created and set up under ``intern_lock`` and never changed
+    afterwards, so threads building the same symbol get the same object.
+    """
+    __slots__ = ("name", "id")
+
+    symbol_table: Dict[Tuple[type, str], "GrammarSymbol"] = dict()
+    symbols_by_id: List["GrammarSymbol"] = list()
+    intern_lock = Lock()
+
+    def __new__(cls, name: str):
+        return cls.__intern__(name)
+
+    @classmethod
+    def __intern__(cls, name: str, *state) -> "GrammarSymbol":
+        key = (cls, name)
+        symbol = GrammarSymbol.symbol_table.get(key)
+        if symbol is not None:
+            return symbol
+
+        with GrammarSymbol.intern_lock:
+            symbol = GrammarSymbol.symbol_table.get(key)
+            if symbol is None:
+                symbol = object.__new__(cls)
+                symbol.name = name
+                symbol.__set_up__(*state)
+                symbol.id = len(GrammarSymbol.symbols_by_id)
+                GrammarSymbol.symbols_by_id.append(symbol)
+                GrammarSymbol.symbol_table[key] = symbol
+
+        return symbol
+
+    def __set_up__(self):
+        pass
+
+    def __reduce__(self):
+        return type(self), (self.name,)
+
+    @staticmethod
+    def by_id(symbol_id: int) -> "GrammarSymbol":
+        return GrammarSymbol.symbols_by_id[symbol_id]
 
     def __str__(self) -> str:
         return self.name
 
     def __eq__(self, other):
-        return type(other) is type(self) and self.name == other.name
+        return self is other
 
     def __hash__(self):
-        return len(self.name)
+        return self.id
 
 
 class NonTerminal(GrammarSymbol):
-    def __init__(self, name):
-        super().__init__(name)
+    __slots__ = ()
 
 
 class FromNonTerminal(NonTerminal):
-    def __init__(self, non_terminal: NonTerminal, additional_symbol: str):
+    __slots__ = ("internal_terminal", "additional_symbol")
+
+    def __new__(cls, non_terminal: NonTerminal, additional_symbol: str):
+        # an existing symbol of the same name is shared and left as it is
+        return cls.__intern__(f"{non_terminal.name}({additional_symbol})", non_terminal, additional_symbol)
+
+    def __set_up__(self, non_terminal: NonTerminal, additional_symbol: str):
         self.internal_terminal = non_terminal
         self.additional_symbol = additional_symbol
-        super().__init__(f"{non_terminal.name}({additional_symbol})")
+
+    def __reduce__(self):
+        return type(self), (self.internal_terminal, self.additional_symbol)
 
 
 class Terminal(GrammarSymbol):
-    def __init__(self, name):
-        super().__init__(name)
+    __slots__ = ()
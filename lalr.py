@@ -0,0 +1,283 @@
+from array import array
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+from cfg import ContextFreeGrammar
+from grammar_symbol import GrammarSymbol, NonTerminal, Terminal
+from grammar_rule import GrammarRule
+from scc import union_over_reachable
+
+
+class LALRParser:
+    """
+    LALR(1) tables built from the LR(0) automaton with lookaheads found by
+    spontaneous generation and propagation (dragon book, algorithm 4.62),
+    and an iterative shift-reduce driver. The grammar is used as written:
+    left recursion and empty rules are fine.
+
+    Rule 0 is the added ``-> S``; the others follow ``grammar.rules``.
+    Dotted rules are dense ids as in ``EarleyRecognizer``. Terminal columns
+    are ``grammar.terminals``, then terminals only found in rules, then the
+    end marker.
+
+    ``action`` is a flat array of deduplicated rows, the row of a state
+    starting at ``action_offsets[state]``. An entry is 0 for an error,
+    ``s + 1`` to shift and go to state ``s``, and ``-(r + 1)`` to reduce
+    by rule ``r``; reducing by rule 0 accepts. ``goto`` is a flat
+    states x nonterminals array, -1 where undefined.
+
+    Conflicts are kept in ``conflicts`` as ``(state, terminal, kept,
+    dropped)`` entries; shifts win over reductions and earlier rules over
+    later ones, as in yacc.
+    """
+    error = 0
+    end_symbol = Terminal("$")
+
+    def __init__(self, grammar: ContextFreeGrammar):
+        self.grammar = grammar
+        # terminals used by rules count even when the grammar does not list them
+        self.terminals: List[Terminal] = list(dict.fromkeys(
+            list(grammar.terminals)
+            + [symbol for rule in grammar.rules for symbol in rule.right_symbols if isinstance(symbol, Terminal)]))
+        self.terminals_by_name: Dict[str, Terminal] = {terminal.name: terminal for terminal in self.terminals}
+        self.terminals.append(LALRParser.end_symbol)
+        self.terminal_ids: Dict[Terminal, int] = {terminal: index for index, terminal in enumerate(self.terminals)}
+        self.non_terminals: List[NonTerminal] = list(dict.fromkeys(
+            list(grammar.non_terminals)
+            + [symbol for rule in grammar.rules for symbol in (rule.left_symbol,) + rule.right_symbols
+               if isinstance(symbol, NonTerminal)]))
+        self.non_terminal_ids: Dict[NonTerminal, int] = {
+            symbol: index for index, symbol in enumerate(self.non_terminals)}
+
+        self.rules: List[Tuple[Optional[NonTerminal], Tuple[GrammarSymbol, ...]]] = \
+            [(None, (grammar.start_non_terminal,))]
+        self.rules += [(rule.left_symbol, rule.right_symbols) for rule in grammar.rules]
+
+        self.next_symbol: List[Optional[GrammarSymbol]] = list()
+        self.rule_of: List[int] = list()
+        self.rule_starts: Dict[NonTerminal, List[int]] = dict()
+        for rule_id, (left_symbol, right_symbols) in enumerate(self.rules):
+            if left_symbol is not None:
+                self.rule_starts.setdefault(left_symbol, []).append(len(self.next_symbol))
+            for symbol in right_symbols:
+                self.next_symbol.append(symbol)
+                self.rule_of.append(rule_id)
+            self.next_symbol.append(None)
+            self.rule_of.append(rule_id)
+
+        self.__create_suffix_first__()
+        self.kernels: List[FrozenSet[int]] = list()
+        self.transitions: List[Dict[GrammarSymbol, int]] = list()
+        self.__create_lr0_automaton__()
+        self.lookaheads: List[Dict[int, int]] = list()
+        self.__create_lookaheads__()
+
+        self.conflicts: List[Tuple[int, Terminal, int, int]] = list()
+        self.action = array("i")
+        self.action_offsets = array("i")
+        self.goto = array("i")
+        self.__create_tables__()
+
+    @property
+    def states_count(self) -> int:
+        return len(self.kernels)
+
+    def __create_suffix_first__(self):
+        """
+        ``suffix_first[d]``: FIRST of what follows the dot of ``d``, with
+        bit ``len(terminals)`` standing for "can be empty".
+        """
+        empty = 1 << len(self.terminals)
+        nullable = set(self.grammar.detect_disappearing_non_terminals())
+
+        direct: Dict[NonTerminal, int] = dict.fromkeys(self.non_terminals, 0)
+        starters: Dict[NonTerminal, List[NonTerminal]] = {symbol: list() for symbol in self.non_terminals}
+        for left_symbol, right_symbols in self.rules[1:]:
+            for symbol in right_symbols:
+                if isinstance(symbol, Terminal):
+                    direct[left_symbol] |= 1 << self.terminal_ids[symbol]
+                    break
+                starters[left_symbol].append(symbol)
+                if symbol not in nullable:
+                    break
+        first = union_over_reachable(self.non_terminals, starters.__getitem__, direct)
+
+        self.suffix_first: List[int] = [0] * len(self.next_symbol)
+        for dotted in reversed(range(len(self.next_symbol))):
+            symbol = self.next_symbol[dotted]
+            if symbol is None:
+                self.suffix_first[dotted] = empty
+            elif isinstance(symbol, Terminal):
+                self.suffix_first[dotted] = 1 << self.terminal_ids[symbol]
+            elif symbol in nullable:
+                self.suffix_first[dotted] = first[symbol] | self.suffix_first[dotted + 1]
+            else:
+                self.suffix_first[dotted] = first[symbol]
+
+    def __closure0__(self, kernel: FrozenSet[int]) -> List[int]:
+        items = list(kernel)
+        seen = set(kernel)
+        expanded = set()
+        for dotted in items:
+            symbol = self.next_symbol[dotted]
+            if isinstance(symbol, NonTerminal) and symbol not in expanded:
+                expanded.add(symbol)
+                for predicted in self.rule_starts.get(symbol, ()):
+                    if predicted not in seen:
+                        seen.add(predicted)
+                        items.append(predicted)
+        return items
+
+    def __create_lr0_automaton__(self):
+        state_ids: Dict[FrozenSet[int], int] = dict()
+
+        def add_state(kernel: FrozenSet[int]) -> int:
+            state = state_ids.get(kernel)
+            if state is None:
+                state = state_ids[kernel] = len(self.kernels)
+                self.kernels.append(kernel)
+                self.transitions.append(dict())
+            return state
+
+        add_state(frozenset([0]))
+        state = 0
+        while state < len(self.kernels):
+            successors: Dict[GrammarSymbol, List[int]] = dict()
+            for dotted in self.__closure0__(self.kernels[state]):
+                symbol = self.next_symbol[dotted]
+                if symbol is not None:
+                    successors.setdefault(symbol, []).append(dotted + 1)
+            for symbol, kernel in successors.items():
+                self.transitions[state][symbol] = add_state(frozenset(kernel))
+            state += 1
+
+    def __closure1__(self, items: Dict[int, int]) -> Dict[int, int]:
+        """
+        LR(1) closure with lookahead bitsets; ``items`` is updated in place.
+        """
+        empty = 1 << len(self.terminals)
+        worklist = list(items)
+        while worklist:
+            dotted = worklist.pop()
+            symbol = self.next_symbol[dotted]
+            if not isinstance(symbol, NonTerminal):
+                continue
+
+            follow = self.suffix_first[dotted + 1]
+            if follow & empty:
+                follow = (follow & ~empty) | items[dotted]
+            for predicted in self.rule_starts.get(symbol, ()):
+                merged = items.get(predicted, 0) | follow
+                if merged != items.get(predicted):
+                    items[predicted] = merged
+                    worklist.append(predicted)
+        return items
+
+    def __create_lookaheads__(self):
+        # the "#" marker of the dragon book takes the bit after the terminals
+        marker = 1 << (len(self.terminals) + 1)
+        self.lookaheads = [dict.fromkeys(kernel, 0) for kernel in self.kernels]
+        self.lookaheads[0][0] = 1 << self.terminal_ids[LALRParser.end_symbol]
+        propagates: Dict[Tuple[int, int], List[Tuple[int, int]]] = dict()
+
+        for state, kernel in enumerate(self.kernels):
+            for kernel_item in kernel:
+                for dotted, lookahead in self.__closure1__({kernel_item: marker}).items():
+                    symbol = self.next_symbol[dotted]
+                    if symbol is None:
+                        continue
+                    target = (self.transitions[state][symbol], dotted + 1)
+                    self.lookaheads[target[0]][target[1]] |= lookahead & ~marker
+                    if lookahead & marker:
+                        propagates.setdefault((state, kernel_item), []).append(target)
+
+        worklist = list(propagates)
+        while worklist:
+            state, kernel_item = worklist.pop()
+            lookahead = self.lookaheads[state][kernel_item]
+            for target_state, target_item in propagates.get((state, kernel_item), ()):
+                merged = self.lookaheads[target_state][target_item] | lookahead
+                if merged != self.lookaheads[target_state][target_item]:
+                    self.lookaheads[target_state][target_item] = merged
+                    worklist.append((target_state, target_item))
+
+    def __create_tables__(self):
+        width = len(self.terminals)
+        rows: Dict[Tuple[int, ...], int] = dict()
+
+        for state in range(self.states_count):
+            row = [LALRParser.error] * width
+
+            for symbol, target in self.transitions[state].items():
+                if isinstance(symbol, Terminal):
+                    row[self.terminal_ids[symbol]] = target + 1
+
+            for dotted, lookahead in self.__closure1__(dict(self.lookaheads[state])).items():
+                if self.next_symbol[dotted] is not None:
+                    continue
+                rule_id = self.rule_of[dotted]
+                for terminal_id in range(width):
+                    if not lookahead >> terminal_id & 1:
+                        continue
+                    current = row[terminal_id]
+                    if current == LALRParser.error:
+                        row[terminal_id] = -(rule_id + 1)
+                    elif current > 0 or -current - 1 < rule_id:
+                        self.conflicts.append((state, self.terminals[terminal_id], current, -(rule_id + 1)))
+                    else:
+                        self.conflicts.append((state, self.terminals[terminal_id], -(rule_id + 1), current))
+                        row[terminal_id] = -(rule_id + 1)
+
+            key = tuple(row)
+            offset = rows.get(key)
+            if offset is None:
+                offset = rows[key] = len(self.action)
+                self.action.extend(row)
+            self.action_offsets.append(offset)
+
+            goto_row = [-1] * len(self.non_terminals)
+            for symbol, target in self.transitions[state].items():
+                if isinstance(symbol, NonTerminal):
+                    goto_row[self.non_terminal_ids[symbol]] = target
+            self.goto.extend(goto_row)
+
+    def is_lalr1(self) -> bool:
+        return not self.conflicts
+
+    def rule(self, rule_id: int) -> GrammarRule:
+        left_symbol, right_symbols = self.rules[rule_id]
+        return GrammarRule(left_symbol, right_symbols)
+
+    def recognize(self, word: Sequence[str]) -> bool:
+        action, action_offsets, goto = self.action, self.action_offsets, self.goto
+        goto_width = len(self.non_terminals)
+        reduce_lengths = [len(right_symbols) for _, right_symbols in self.rules]
+        reduce_targets = [-1] + [self.non_terminal_ids[left_symbol] for left_symbol, _ in self.rules[1:]]
+        end_id = self.terminal_ids[LALRParser.end_symbol]
+
+        stack = [0]
+        position = 0
+        token_id = self.__token_id__(word, position, end_id)
+
+        while True:
+            if token_id < 0:
+                return False
+            entry = action[action_offsets[stack[-1]] + token_id]
+
+            if entry > 0:
+                stack.append(entry - 1)
+                position += 1
+                token_id = self.__token_id__(word, position, end_id)
+            elif entry < 0:
+                rule_id = -entry - 1
+                if rule_id == 0:
+                    return True
+                if reduce_lengths[rule_id]:
+                    del stack[-reduce_lengths[rule_id]:]
+                stack.append(goto[stack[-1] * goto_width + reduce_targets[rule_id]])
+            else:
+                return False
+
+    def __token_id__(self, word: Sequence[str], position: int, end_id: int) -> int:
+        if position >= len(word):
+            return end_id
+        token = self.terminals_by_name.get(word[position])
+        return -1 if token is None else self.terminal_ids[token]
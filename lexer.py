@@ -0,0 +1,91 @@
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+from msp import LTS, LabelledTransition
+from dfa import DFA
+from rex import ReX
+
+
+class LexerError(ValueError):
+    def __init__(self, position: int):
+        super().__init__(f"no token matches at position {position}")
+        self.position = position
+
+
+class Token:
+    __slots__ = ("kind", "text", "start")
+
+    def __init__(self, kind: str, text: Sequence[str], start: int):
+        self.kind = kind
+        self.text = text
+        self.start = start
+
+    def __repr__(self) -> str:
+        return f"Token({self.kind!r}, {self.text!r}, {self.start})"
+
+
+class Lexer:
+    """
+    Maximal munch tokenizer for ``(token_name, ReX)`` definitions.
+
+    All definitions are merged into one LTS behind a common start state and
+    determinized together. Every DFA state is tagged with the earliest
+    definition whose end state it contains, so the longest match wins and
+    ties go to the definition listed first. Tokens whose kind is in ``skip``
+    are matched but not emitted.
+    """
+
+    def __init__(self, definitions: Sequence[Tuple[str, ReX]], skip: Iterable[str] = ()):
+        self.token_names = [name for name, _ in definitions]
+        self.skip = set(skip)
+
+        transitions: List[LabelledTransition] = list()
+        start, next_state = 0, 1
+        priority_of_end: Dict[int, int] = dict()
+
+        for priority, (_, rex) in enumerate(definitions):
+            rex_start, rex_end = rex.__add_transitions__(next_state, transitions)
+            transitions.append(LabelledTransition(start, rex_start, "", ))
+            priority_of_end[rex_end] = priority
+            next_state = rex_end + 1
+
+        lts = LTS(start, start, range(next_state), transitions)
+        labels, table, state_sets = lts.__subset_construction__()
+
+        self.accept_tags: List[int] = [
+            min((priority_of_end[state] for state in state_set if state in priority_of_end), default=-1)
+            for state_set in state_sets
+        ]
+        self.dfa = DFA(0, labels, table, [tag >= 0 for tag in self.accept_tags])
+
+    def tokenize(self, text: Sequence[str]) -> Iterator[Token]:
+        labels, table, width = self.dfa.labels, self.dfa.table, len(self.dfa.labels)
+        accept_tags = self.accept_tags
+        position = 0
+
+        while position < len(text):
+            state = self.dfa.start
+            last_tag, last_end = -1, position
+
+            for current in range(position, len(text)):
+                label_id = labels.get(text[current])
+                if label_id is None:
+                    break
+                state = table[state * width + label_id]
+                if state < 0:
+                    break
+                if accept_tags[state] >= 0:
+                    last_tag, last_end = accept_tags[state], current + 1
+
+            # empty matches are ignored, they would never advance the input
+            if last_tag < 0:
+                raise LexerError(position)
+
+            kind = self.token_names[last_tag]
+            if kind not in self.skip:
+                yield Token(kind, text[position:last_end], position)
+            position = last_end
+
+    def token_kinds(self, text: Sequence[str]) -> List[str]:
+        """
+        Token names only, in the form ``Parser.is_in_language*`` expects.
+        """
+        return [token.kind for token in self.tokenize(text)]
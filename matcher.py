@@ -0,0 +1,62 @@
+from typing import Sequence, Union, BinaryIO, TextIO
+
+
+class StreamMatcher:
+    """
+    Incremental whole-input matcher over any automaton that provides
+    ``start``, ``dead``, ``run(state, chain)`` and ``is_final(state)``
+    (``DFA``, ``LazyDFA``, ``BitParallelNFA``).
+
+    Only the current automaton state is kept between chunks. ``bytes``
+    chunks are read as latin-1, so every byte is one label.
+
+    Automata that renumber their states (``LazyDFA`` flushes, possibly
+    caused by another matcher sharing it) expose ``generation``,
+    ``state_sets`` and ``intern``; the matcher then also keeps the subset
+    behind its state and re-interns it once the generation has moved on.
+    """
+
+    def __init__(self, automaton):
+        self.automaton = automaton
+        self.renumbering = hasattr(automaton, "generation")
+        self.reset()
+
+    def reset(self):
+        self.__remember__(self.automaton.start)
+        self.consumed = 0
+
+    def __remember__(self, state: int):
+        self.state = state
+        if self.renumbering:
+            self.generation = self.automaton.generation
+            self.state_set = self.automaton.state_sets[state] if state >= 0 else None
+
+    def __current_state__(self) -> int:
+        if self.renumbering and self.state_set is not None and self.generation != self.automaton.generation:
+            self.__remember__(self.automaton.intern(self.state_set))
+        return self.state
+
+    def feed(self, chunk: Union[Sequence[str], bytes, bytearray, memoryview]) -> "StreamMatcher":
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = bytes(chunk).decode("latin-1")
+
+        self.consumed += len(chunk)
+        if self.state != self.automaton.dead:
+            self.__remember__(self.automaton.run(self.__current_state__(), chunk))
+        return self
+
+    def feed_file(self, file: Union[BinaryIO, TextIO], chunk_size: int = 1 << 16) -> "StreamMatcher":
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return self
+            self.feed(chunk)
+
+    def is_accepting(self) -> bool:
+        return self.automaton.is_final(self.__current_state__())
+
+    def is_dead(self) -> bool:
+        """
+        True once no continuation of the input can be accepted any more.
+        """
+        return self.state == self.automaton.dead
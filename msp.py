@@ -1,8 +1,13 @@
-from typing import Set, Dict, List, Tuple, Sequence, Optional
-from collections import defaultdict
+from typing import Set, Dict, List, Tuple, Sequence, FrozenSet, Iterable, Collection, Optional
+from array import array
+from dfa import DFA, LazyDFA
+from bitset_nfa import BitParallelNFA
+from matcher import StreamMatcher
 
 
 class LabelledTransition:
+    __slots__ = ("from_state", "to_state", "label")
+
     def __init__(self,
                  from_state: int,
                  to_state: int,
@@ -14,67 +19,189 @@ class LabelledTransition:
 
 
 class LTS:
+    """
+    Labelled transition system stored in CSR form.
+
+    Labels are mapped to dense ids (``labels``), the empty label gets
+    ``LTS.epsilon``. The outgoing edges of ``state`` are
+    ``edge_labels[offsets[state]:offsets[state + 1]]`` and the matching
+    ``edge_targets``, sorted by label id, so epsilon edges come first.
+    Epsilon closures are taken on demand by walking those edges, marking
+    visited states with a per-walk stamp in ``visited`` so the array is
+    never cleared; storing every closure would be quadratic in the states.
+    Closures of labelled edge targets, the ones subset construction unions
+    over and over, are kept in ``target_closures`` until they hold
+    ``closure_cache_factor`` entries per state.
+    """
+    epsilon = -1
+    closure_cache_factor = 8
+
     def __init__(self,
                  start: int,
                  end: int,
-                 states: Set[int],
-                 transitions: Set[LabelledTransition],
+                 states: Collection[int],
+                 transitions: Iterable[LabelledTransition],
                  ):
         self.start = start
         self.end = end
         self.states = states
-        self.transitions = transitions
 
-        trans_dict: Dict[Tuple[int, str], List[LabelledTransition]] = defaultdict(list)
+        edges: List[Tuple[int, int, str]] = [(tr.from_state, tr.to_state, tr.label) for tr in transitions]
+
+        self.labels: Dict[str, int] = {
+            label: i for i, label in enumerate(sorted({label for _, _, label in edges if label}))
+        }
+        self.size = max([start, end] + list(states) + [state for edge in edges for state in edge[:2]]) + 1
+
+        encoded = sorted(
+            (from_state, self.labels[label] if label else LTS.epsilon, to_state)
+            for from_state, to_state, label in edges
+        )
+        del edges
+
+        self.offsets = array("i", [0] * (self.size + 1))
+        self.edge_labels = array("i", [label_id for _, label_id, _ in encoded])
+        self.edge_targets = array("i", [to_state for _, _, to_state in encoded])
+        for from_state, _, _ in encoded:
+            self.offsets[from_state + 1] += 1
+        for state in range(self.size):
+            self.offsets[state + 1] += self.offsets[state]
+
+        # epsilon edges of ``state`` end at ``epsilon_ends[state]``
+        self.epsilon_ends = self.offsets[:-1]
+        for from_state, label_id, _ in encoded:
+            if label_id == LTS.epsilon:
+                self.epsilon_ends[from_state] += 1
+
+        self.visited: List[int] = [0] * self.size
+        self.visit_stamp = 0
+        self.target_closures: Dict[int, Tuple[int, ...]] = dict()
+        self.closure_cache_room = LTS.closure_cache_factor * self.size
+        self.__bit_parallel__: Optional[BitParallelNFA] = None
+
+    @property
+    def transitions(self) -> Set[LabelledTransition]:
+        label_names = {label_id: label for label, label_id in self.labels.items()}
+        label_names[LTS.epsilon] = ""
+
+        return {
+            LabelledTransition(state, self.edge_targets[edge], label_names[self.edge_labels[edge]])
+            for state in range(self.size)
+            for edge in range(self.offsets[state], self.offsets[state + 1])
+        }
+
+    def closure_of(self, states: Iterable[int]) -> List[int]:
+        """
+        States reachable from ``states`` by epsilon edges, ``states``
+        included, in no particular order.
+        """
+        offsets, epsilon_ends, edge_targets = self.offsets, self.epsilon_ends, self.edge_targets
+        self.visit_stamp += 1
+        stamp, visited = self.visit_stamp, self.visited
+
+        closure: List[int] = list()
+        for state in states:
+            if visited[state] != stamp:
+                visited[state] = stamp
+                closure.append(state)
+
+        # closure grows while we walk it, so it doubles as the work queue
+        for current_state in closure:
+            for edge in range(offsets[current_state], epsilon_ends[current_state]):
+                target = edge_targets[edge]
+                # to prevent cycles
+                if visited[target] != stamp:
+                    visited[target] = stamp
+                    closure.append(target)
+
+        return closure
+
+    def closure(self, state: int) -> Sequence[int]:
+        return sorted(self.closure_of((state,)))
+
+    def __get_reachable_states__(self, states: Iterable[int]) -> Set[int]:
+        return set(self.closure_of(states))
+
+    def __move__(self, states: Iterable[int], label_id: int) -> FrozenSet[int]:
+        """
+        States reachable from ``states`` by one ``label_id`` edge,
+        closed under epsilon transitions.
+        """
+        offsets, edge_labels, edge_targets = self.offsets, self.edge_labels, self.edge_targets
+        target_closures = self.target_closures
+
+        result_set: Set[int] = set()
+        uncached: List[int] = list()
+        for state in states:
+            for edge in range(offsets[state], offsets[state + 1]):
+                if edge_labels[edge] != label_id:
+                    continue
+                target = edge_targets[edge]
+                closure = target_closures.get(target)
+                if closure is None and self.closure_cache_room > 0:
+                    closure = target_closures[target] = tuple(self.closure_of((target,)))
+                    self.closure_cache_room -= len(closure)
+                if closure is None:
+                    uncached.append(target)
+                else:
+                    result_set.update(closure)
+
+        if uncached:
+            result_set.update(self.closure_of(uncached))
+        return frozenset(result_set)
+
+    def bit_parallel(self) -> BitParallelNFA:
+        if self.__bit_parallel__ is None:
+            self.__bit_parallel__ = BitParallelNFA(self)
+        return self.__bit_parallel__
 
-        for tr in transitions:
-            trans_dict[(tr.from_state, tr.label)].append(tr)
-        self.trans_from_lbl = dict(trans_dict)
+    def accepts(self, chain: Sequence[str]) -> bool:
+        return self.bit_parallel().accepts(chain)
 
-    def __get_suitable_transitions__(self, from_state: int, label: str) -> Optional[List[LabelledTransition]]:
-        return self.trans_from_lbl.get((from_state, label))
+    def matcher(self) -> StreamMatcher:
+        return self.bit_parallel().matcher()
 
-    def __get_reachable_states__(self, states: List[int]) -> Set[int]:
-        result_set = set(states)
-        added = list(result_set)
-        while added:
-            current_state = added.pop()
-            suitable_transitions = self.__get_suitable_transitions__(current_state, "")
+    def __subset_construction__(self) -> Tuple[Dict[str, int], array, List[FrozenSet[int]]]:
+        label_ids = dict(self.labels)
 
-            # if no epsilon transitions
-            if suitable_transitions is None:
-                continue
-            for transition in suitable_transitions:
-                # to prevent cycles
-                """
-                instead of directly comparing sets each iteration 
-                we verify if the new element already present in set
-                """
-                if transition.to_state not in result_set:
-                    result_set.add(transition.to_state)
-                    added.append(transition.to_state)
-        return result_set
+        start_set = frozenset(self.closure(self.start))
+        set_ids: Dict[FrozenSet[int], int] = {start_set: 0}
+        state_sets: List[FrozenSet[int]] = [start_set]
+        table = array("i")
 
-    def accepts(self, chain: Sequence[str]) -> bool:
+        # state_sets grows while we walk it, so it doubles as the work queue
+        current = 0
+        while current < len(state_sets):
+            current_set = state_sets[current]
+            current += 1
 
-        expected_length = len(chain)
+            for label_id in range(len(label_ids)):
+                target_set = self.__move__(current_set, label_id)
 
-        reached_states = {(x, 0) for x in self.__get_reachable_states__([self.start])}
+                if not target_set:
+                    table.append(DFA.dead)
+                    continue
 
-        while reached_states:
-            current_state, current_length = reached_states.pop()
+                target_id = set_ids.get(target_set)
+                if target_id is None:
+                    target_id = len(state_sets)
+                    set_ids[target_set] = target_id
+                    state_sets.append(target_set)
+                table.append(target_id)
 
-            if current_length == expected_length:
-                if current_state == self.end:
-                    return True
-                continue
+        return label_ids, table, state_sets
 
-            current_label = chain[current_length]
+    def determinize(self) -> DFA:
+        label_ids, table, state_sets = self.__subset_construction__()
 
-            to_transitions = self.__get_suitable_transitions__(current_state, current_label)
+        return DFA(0,
+                   label_ids,
+                   table,
+                   [self.end in state_set for state_set in state_sets],
+                   )
 
-            if to_transitions:
-                new_states = list(map(lambda tr: tr.to_state, to_transitions))
+    def compile(self) -> DFA:
+        return self.determinize().minimize()
 
-                reached_states.update([(x, current_length + 1) for x in self.__get_reachable_states__(new_states)])
-        return False
+    def lazy_determinize(self, max_states: int = 1024) -> LazyDFA:
+        return LazyDFA(self, max_states)
@@ -1,8 +1,19 @@
 from cfg import ContextFreeGrammar
 from grammar_symbol import GrammarSymbol, Terminal, NonTerminal
 from grammar_rule import GrammarRule
-from typing import Sequence, Dict, List, Set
+from typing import Sequence, Dict, List, Set, Tuple, Union
 from collections import defaultdict
+from functools import cached_property
+from scc import union_over_reachable
+from earley import EarleyRecognizer
+from packrat import PackratRecognizer
+from parse_tree import ParseTree
+
+
+class ParseError(ValueError):
+    def __init__(self, position: int):
+        super().__init__(f"unexpected token at position {position}")
+        self.position = position
 
 
 class Parser:
@@ -10,133 +21,268 @@ class Parser:
 
     end_symbol = Terminal("$")
 
-    def __init__(self, cfg: ContextFreeGrammar):
+    def __init__(self, cfg: ContextFreeGrammar, max_memo_size: int = 1 << 16):
+        # kept for the recognizers below, which are only built when used
+        self.original_grammar = cfg
+        self.max_memo_size = max_memo_size
         self.grammar = cfg \
             .remove_external_non_terminals() \
             .transform_to_greibach_form() \
             .remove_left_recursion() \
             .factorize_grammar()
 
+        used_symbols = [symbol for rule in self.grammar.rules for symbol in (rule.left_symbol,) + rule.right_symbols]
+        self.terminals_by_bit: List[Terminal] = list(dict.fromkeys(
+            [Parser.epsilon, Parser.end_symbol] + list(self.grammar.terminals)
+            + [symbol for symbol in used_symbols if isinstance(symbol, Terminal)]))
+        self.terminal_bits: Dict[Terminal, int] = {
+            terminal: 1 << index for index, terminal in enumerate(self.terminals_by_bit)}
+        self.non_terminals: List[NonTerminal] = list(dict.fromkeys(
+            list(self.grammar.non_terminals) + [symbol for symbol in used_symbols if isinstance(symbol, NonTerminal)]))
+
+        self.first_bits: Dict[NonTerminal, int] = dict()
+        self.follow_bits: Dict[NonTerminal, int] = dict()
+        self.suffix_first_bits: Dict[GrammarRule, List[int]] = dict()
         self.first_dict: Dict[NonTerminal, Set[Terminal]] = defaultdict(set)
         self.follows_dict: Dict[NonTerminal, Set[Terminal]] = defaultdict(set)
         self.__create_first__()
         self.__create_follows__()
 
-    def __create_first__(self):
-        first_dict = self.first_dict
-        changed = True
-        while changed:
-            changed = False
-
-            for rule in self.grammar.rules:
-                current_symbol = rule.left_symbol
-                previous_size = len(first_dict[current_symbol])
-
-                first_dict[current_symbol].update(self.first(rule.right_symbols))
+        self.terminals_by_name: Dict[str, Terminal] = {terminal.name: terminal for terminal in self.grammar.terminals}
+        self.table: Dict[Tuple[NonTerminal, Terminal], GrammarRule] = dict()
+        self.rule_ids: Dict[GrammarRule, int] = {rule: index for index, rule in enumerate(self.grammar.rules)}
+        # right sides reversed, as ``parse`` pushes them
+        self.rule_pushes: List[Tuple[GrammarSymbol, ...]] = [rule.right_symbols[::-1] for rule in self.grammar.rules]
+        self.conflicts: List[Tuple[NonTerminal, Terminal, GrammarRule, GrammarRule]] = list()
+        self.__create_table__()
 
-                current_size = len(first_dict[current_symbol])
-                changed = changed or previous_size != current_size
+    @cached_property
+    def earley(self) -> EarleyRecognizer:
+        return EarleyRecognizer(self.original_grammar)
 
-        return first_dict
-
-    def first(self, word: Sequence[GrammarSymbol]) -> List[Terminal]:
-        if not word:
-            return [Parser.epsilon]
+    @cached_property
+    def packrat(self) -> PackratRecognizer:
+        return PackratRecognizer(self.grammar, self.max_memo_size)
 
+    def __terminals_of__(self, bits: int) -> List[Terminal]:
         result: List[Terminal] = list()
-        has_epsilon_before = True
-
-        for symbol in word:
-            if isinstance(symbol, Terminal):
-                result += [symbol]
-                has_epsilon_before = False
-
-            if not has_epsilon_before:
-                break
-
-            result += list(self.first_dict[symbol])
-            has_epsilon_before = Parser.epsilon in self.first_dict[symbol]
-
-        if has_epsilon_before:
-            result.append(Parser.epsilon)
-
+        while bits:
+            lowest = bits & -bits
+            result.append(self.terminals_by_bit[lowest.bit_length() - 1])
+            bits ^= lowest
         return result
-        # def parse(self,symbols:Sequence[str]):
-
-    def __create_follows__(self) -> Dict[NonTerminal, Set[Terminal]]:
-        follows_dict = self.follows_dict
-        follows_dict[self.grammar.start_non_terminal].add(Parser.end_symbol)
-
-        def filter_epsilon(terminals: Sequence[Terminal]) -> List[Terminal]:
-            result: List[Terminal] = list()
-            for terminal in terminals:
-                if terminal != Parser.epsilon:
-                    result.append(terminal)
-            return result
-
-        def handle_rule(left_symbol: NonTerminal, current_symbol: NonTerminal, word: Sequence[GrammarSymbol]):
-            if not word:
-                follows_dict[current_symbol].update(follows_dict[left_symbol])
-                return
 
-            first_word = self.first(word)
-
-            follows_dict[current_symbol].update(filter_epsilon(first_word))
-            if Parser.epsilon in first_word:
-                follows_dict[current_symbol].update(follows_dict[left_symbol])
-
-        changed = True
-        while changed:
-            changed = False
-
-            for rule in self.grammar.rules:
-                beta: List[GrammarSymbol] = list()
-                for i in reversed(range(0, len(rule.right_symbols))):
-                    beta = [rule.right_symbols[i]] + beta
-                    current_symbol = rule.right_symbols[i]
-
-                    if not isinstance(current_symbol, NonTerminal):
-                        continue
-                    previous_size = len(follows_dict[current_symbol])
+    def __first_bits_of__(self, symbol: GrammarSymbol) -> int:
+        if isinstance(symbol, NonTerminal):
+            return self.first_bits.get(symbol, 0)
+        return self.terminal_bits.get(symbol, 0)
+
+    def __word_first_bits__(self, word: Sequence[GrammarSymbol], tail: int) -> int:
+        """
+        FIRST of ``word`` followed by something whose FIRST is ``tail``.
+        """
+        epsilon = self.terminal_bits[Parser.epsilon]
+        result = tail
+        for symbol in reversed(word):
+            symbol_bits = self.__first_bits_of__(symbol)
+            result = (symbol_bits & ~epsilon) | result if symbol_bits & epsilon else symbol_bits
+        return result
 
-                    handle_rule(rule.left_symbol, current_symbol, beta[1:])
+    def __create_first__(self):
+        """
+        FIRST(A) is what A's rules start with directly, joined over every B
+        that can start a rule of A after a nullable prefix.
+        """
+        epsilon = self.terminal_bits[Parser.epsilon]
+        disappearing = set(self.grammar.detect_disappearing_non_terminals())
+        direct: Dict[NonTerminal, int] = dict.fromkeys(self.non_terminals, 0)
+        starters: Dict[NonTerminal, List[NonTerminal]] = {symbol: list() for symbol in self.non_terminals}
+
+        for rule in self.grammar.rules:
+            for symbol in rule.right_symbols:
+                if not isinstance(symbol, NonTerminal):
+                    direct[rule.left_symbol] |= self.terminal_bits[symbol]
+                    break
+                starters[rule.left_symbol].append(symbol)
+                if symbol not in disappearing:
+                    break
+
+        self.first_bits = union_over_reachable(self.non_terminals, starters.__getitem__, direct)
+        # epsilon is not inherited from starters, only nullable symbols have it
+        for symbol in disappearing:
+            self.first_bits[symbol] |= epsilon
+
+        for rule in self.grammar.rules:
+            suffixes = [epsilon]
+            for symbol in reversed(rule.right_symbols):
+                suffixes.append(self.__word_first_bits__((symbol,), suffixes[-1]))
+            suffixes.reverse()
+            self.suffix_first_bits[rule] = suffixes
+
+        for symbol, bits in self.first_bits.items():
+            self.first_dict[symbol].update(self.__terminals_of__(bits))
+
+        return self.first_dict
 
-                    current_size = len(follows_dict[current_symbol])
-                    changed = changed or previous_size != current_size
+    def first(self, word: Sequence[GrammarSymbol]) -> List[Terminal]:
+        return self.__terminals_of__(self.__word_first_bits__(word, self.terminal_bits[Parser.epsilon]))
 
-        return follows_dict
+    def __create_follows__(self) -> Dict[NonTerminal, Set[Terminal]]:
+        """
+        FOLLOW(B) collects FIRST of what comes after B in each rule, joined
+        over FOLLOW of the left symbol of every rule that B can end.
+        """
+        epsilon = self.terminal_bits[Parser.epsilon]
+        direct: Dict[NonTerminal, int] = dict.fromkeys(self.non_terminals, 0)
+        direct[self.grammar.start_non_terminal] = self.terminal_bits[Parser.end_symbol]
+        enclosing: Dict[NonTerminal, List[NonTerminal]] = {symbol: list() for symbol in self.non_terminals}
+
+        for rule in self.grammar.rules:
+            suffixes = self.suffix_first_bits[rule]
+            for position, symbol in enumerate(rule.right_symbols):
+                if not isinstance(symbol, NonTerminal):
+                    continue
+                direct[symbol] |= suffixes[position + 1] & ~epsilon
+                if suffixes[position + 1] & epsilon:
+                    enclosing[symbol].append(rule.left_symbol)
+
+        self.follow_bits = union_over_reachable(self.non_terminals, enclosing.__getitem__, direct)
+
+        for symbol, bits in self.follow_bits.items():
+            self.follows_dict[symbol].update(self.__terminals_of__(bits))
+
+        return self.follows_dict
+
+    def __create_table__(self):
+        """
+        LL(1) table: a rule is predicted by the terminals of its FIRST set
+        and, when it can disappear, by the FOLLOW set of its left symbol.
+        Clashing cells are recorded in ``conflicts``; the earlier rule stays.
+        """
+        table = self.table
+        epsilon = self.terminal_bits[Parser.epsilon]
+
+        for rule in self.grammar.rules:
+            lookaheads = self.suffix_first_bits[rule][0]
+            if lookaheads & epsilon:
+                lookaheads = (lookaheads & ~epsilon) | self.follow_bits[rule.left_symbol]
+
+            for terminal in self.__terminals_of__(lookaheads):
+                key = (rule.left_symbol, terminal)
+                predicted = table.setdefault(key, rule)
+                if predicted is not rule:
+                    self.conflicts.append((rule.left_symbol, terminal, predicted, rule))
+
+        return table
+
+    def is_ll1(self) -> bool:
+        return not self.conflicts
 
     def is_in_language_with_first_follows(self, word: Sequence[str]) -> bool:
-        word_queue = ["$"] + list(reversed(word))
-
-        def get_cur_token() -> str:
-            return word_queue[len(word_queue) - 1]
-
-        def on_next_token(current_symbol) -> bool:
-
-            for rule in self.grammar.rules_dict[current_symbol]:
-                if Terminal(get_cur_token()) in self.first(rule.right_symbols):
-                    for symbol in rule.right_symbols:
-                        if isinstance(symbol, Terminal):
-                            if symbol != Terminal(get_cur_token()):
-                                return False
-                            word_queue.pop()
-                        else:
-                            if not on_next_token(symbol):
-                                return False
-
+        terminals_by_name, table = self.terminals_by_name, self.table
+        stack: List[GrammarSymbol] = [Parser.end_symbol, self.grammar.start_non_terminal]
+        position = 0
+
+        while True:
+            if position < len(word):
+                token = terminals_by_name.get(word[position])
+                if token is None:
+                    return False
+            else:
+                token = Parser.end_symbol
+
+            top = stack.pop()
+            if top is token:
+                if token is Parser.end_symbol:
                     return True
-
-            if GrammarRule(current_symbol, []) in self.grammar.rules_dict[current_symbol] \
-                    and Terminal(get_cur_token()) in self.follows_dict[current_symbol]:
-                return True
-            return False
-
-        return on_next_token(self.grammar.start_non_terminal)
+                position += 1
+                continue
+
+            if not isinstance(top, NonTerminal):
+                return False
+
+            rule = table.get((top, token))
+            if rule is None:
+                return False
+            stack.extend(reversed(rule.right_symbols))
+
+    def parse(self, word: Sequence[str]) -> ParseTree:
+        """
+        Same walk as ``is_in_language_with_first_follows``, recording every
+        expansion into a ``ParseTree`` arena. Raises ``ParseError`` at the
+        first token that cannot be predicted or matched.
+        """
+        terminals_by_name, table, rule_ids = self.terminals_by_name, self.table, self.rule_ids
+        rule_pushes = self.rule_pushes
+        tree = ParseTree(word, self.grammar.rules)
+        symbols, ends, subtree_ends = tree.symbols, tree.ends, tree.subtree_ends
+        add_symbol, add_rule, add_start, add_end, add_subtree_end = \
+            symbols.append, tree.rules.append, tree.starts.append, ends.append, subtree_ends.append
+        # an int entry ~node closes node once its subtree is done
+        stack: List[Union[GrammarSymbol, int]] = [self.grammar.start_non_terminal]
+        position = 0
+
+        def token_at(index: int) -> Terminal:
+            if index >= len(word):
+                return Parser.end_symbol
+            token = terminals_by_name.get(word[index])
+            if token is None:
+                raise ParseError(index)
+            return token
+
+        token = token_at(position)
+        while stack:
+            symbol = stack.pop()
+            if isinstance(symbol, int):
+                ends[~symbol] = position
+                subtree_ends[~symbol] = len(symbols)
+                continue
+
+            node = len(symbols)
+            add_symbol(symbol.id)
+            add_start(position)
+
+            if not isinstance(symbol, NonTerminal):
+                if symbol is not token:
+                    raise ParseError(position)
+                position += 1
+                add_rule(-1)
+                add_end(position)
+                add_subtree_end(node + 1)
+                token = token_at(position)
+                continue
+
+            rule = table.get((symbol, token))
+            if rule is None:
+                raise ParseError(position)
+            rule_id = rule_ids[rule]
+            add_rule(rule_id)
+            add_end(position)
+            add_subtree_end(node + 1)
+            if rule.right_symbols:
+                stack.append(~node)
+                stack.extend(rule_pushes[rule_id])
+
+        if token is not Parser.end_symbol:
+            raise ParseError(position)
+        return tree
+
+    def is_in_language_with_earley(self, word: Sequence[str]) -> bool:
+        """
+        Works on the grammar as given, before any transformation.
+        """
+        return self.earley.recognize(word)
+
+    def is_in_language_memoized(self, word: Sequence[str]) -> bool:
+        """
+        Same answer as ``is_in_language``; see ``packrat.memo`` for hit and
+        eviction counts.
+        """
+        return self.packrat.recognize(word)
 
     def is_in_language(self, word: Sequence[str], cur_symbols=None) -> bool:
         if cur_symbols is None:
-            cur_symbols = [self.grammar.start_non_terminal]
+            cur_symbols = (self.grammar.start_non_terminal,)
 
         if not word:
             disappearing = self.grammar.detect_disappearing_non_terminals()
@@ -179,3 +325,6 @@ if __name__ == "__main__":
     print(parser.is_in_language("n+(n+n)*n"))
     print(parser.is_in_language("n(n+n)*n"))
     print(parser.is_in_language("(n+n)"))
+
+    print(parser.is_in_language_with_earley("n+(n+n)*n"))
+    print(parser.is_in_language_with_earley("n(n+n)*n"))
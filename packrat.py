@@ -0,0 +1,137 @@
+from typing import Dict, FrozenSet, Generator, List, Optional, Sequence, Set, Tuple
+from collections import OrderedDict
+from cfg import ContextFreeGrammar
+from grammar_symbol import GrammarSymbol, NonTerminal, Terminal
+
+# (nonterminal id, input offset)
+MemoKey = Tuple[int, int]
+
+
+class PackratMemo:
+    """
+    LRU table from ``(nonterminal id, offset)`` to every offset the
+    nonterminal can end at. Counters survive ``purge`` so the hit rate
+    covers all inputs checked so far.
+    """
+
+    def __init__(self, max_size: int = 1 << 16):
+        self.max_size = max_size
+        self.entries: "OrderedDict[MemoKey, FrozenSet[int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: MemoKey) -> Optional[FrozenSet[int]]:
+        ends = self.entries.get(key)
+        if ends is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return ends
+
+    def put(self, key: MemoKey, ends: FrozenSet[int]):
+        if self.max_size > 0:
+            self.entries[key] = ends
+            self.__evict__()
+
+    def resize(self, max_size: int):
+        self.max_size = max_size
+        self.__evict__()
+
+    def __evict__(self):
+        while len(self.entries) > max(self.max_size, 0):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def purge(self):
+        self.entries.clear()
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class PackratRecognizer:
+    """
+    Top-down recognizer with the alternatives of ``Parser.is_in_language``,
+    memoizing the end offsets of each nonterminal at each input offset.
+    Positions are indexes into the token list and expansion runs on an
+    explicit stack of generators, so deep inputs do not recurse.
+
+    A nonterminal reached again at the same offset while it is still being
+    expanded contributes nothing there. The ``Parser`` grammar has no left
+    recursion, so this only cuts cycles of unit rules.
+    """
+
+    def __init__(self, grammar: ContextFreeGrammar, max_memo_size: int = 1 << 16):
+        self.grammar = grammar
+        self.terminals_by_name: Dict[str, Terminal] = {terminal.name: terminal for terminal in grammar.terminals}
+        self.rules_by_id: Dict[int, List[Tuple[GrammarSymbol, ...]]] = dict()
+        for rule in grammar.rules:
+            self.rules_by_id.setdefault(rule.left_symbol.id, []).append(rule.right_symbols)
+        self.memo = PackratMemo(max_memo_size)
+
+    def __expand__(self, tokens: Sequence[Terminal], symbol_id: int, offset: int) \
+            -> Generator[MemoKey, FrozenSet[int], FrozenSet[int]]:
+        result: Set[int] = set()
+
+        for right_symbols in self.rules_by_id.get(symbol_id, ()):
+            offsets: Set[int] = {offset}
+            for symbol in right_symbols:
+                next_offsets: Set[int] = set()
+                for current in sorted(offsets):
+                    if isinstance(symbol, NonTerminal):
+                        next_offsets |= yield symbol.id, current
+                    elif current < len(tokens) and tokens[current] is symbol:
+                        next_offsets.add(current + 1)
+                offsets = next_offsets
+                if not offsets:
+                    break
+            result |= offsets
+
+        return frozenset(result)
+
+    def __ends__(self, tokens: Sequence[Terminal], root: MemoKey) -> FrozenSet[int]:
+        memo = self.memo
+        ends = memo.get(root)
+        if ends is not None:
+            return ends
+
+        in_progress: Set[MemoKey] = {root}
+        stack = [(root, self.__expand__(tokens, *root))]
+        ends = None
+
+        while stack:
+            key, expansion = stack[-1]
+            try:
+                request = expansion.send(ends)
+            except StopIteration as stop:
+                stack.pop()
+                in_progress.discard(key)
+                memo.put(key, stop.value)
+                ends = stop.value
+                continue
+
+            ends = memo.get(request)
+            if ends is None:
+                if request in in_progress:
+                    ends = frozenset()
+                else:
+                    in_progress.add(request)
+                    stack.append((request, self.__expand__(tokens, *request)))
+
+        return ends
+
+    def recognize(self, word: Sequence[str]) -> bool:
+        tokens: List[Terminal] = list()
+        for name in word:
+            token = self.terminals_by_name.get(name)
+            if token is None:
+                return False
+            tokens.append(token)
+
+        # offsets are only meaningful for one input
+        self.memo.purge()
+        return len(tokens) in self.__ends__(tokens, (self.grammar.start_non_terminal.id, 0))
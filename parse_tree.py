@@ -0,0 +1,93 @@
+from array import array
+from typing import Iterator, Optional, Sequence, Tuple, TYPE_CHECKING
+from grammar_symbol import GrammarSymbol
+
+if TYPE_CHECKING:
+    from grammar_rule import GrammarRule
+
+
+class ParseTree:
+    """
+    Parse tree stored as parallel arrays, one slot per node in pre-order:
+    ``symbols`` holds symbol ids, ``rules`` the rule index into
+    ``rules_table`` (-1 for tokens), ``starts`` / ``ends`` the token span.
+    The first child of a node is the next slot and ``subtree_ends[n]`` is
+    the slot after the last descendant of ``n``, i.e. its next sibling, so
+    children are found by hopping through ``subtree_ends``. Node 0 is the
+    root. ``ParseNode`` objects are only made on access.
+    """
+
+    def __init__(self, word: Sequence[str], rules_table: Sequence["GrammarRule"]):
+        self.word = word
+        self.rules_table = rules_table
+        self.symbols = array("i")
+        self.rules = array("i")
+        self.starts = array("i")
+        self.ends = array("i")
+        self.subtree_ends = array("i")
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    @property
+    def root(self) -> "ParseNode":
+        return ParseNode(self, 0)
+
+    def node(self, index: int) -> "ParseNode":
+        return ParseNode(self, index)
+
+    def walk(self) -> Iterator["ParseNode"]:
+        """
+        Nodes in pre-order, which is the storage order.
+        """
+        for index in range(len(self)):
+            yield ParseNode(self, index)
+
+
+class ParseNode:
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree: ParseTree, index: int):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def symbol(self) -> GrammarSymbol:
+        return GrammarSymbol.by_id(self.tree.symbols[self.index])
+
+    @property
+    def rule(self) -> Optional["GrammarRule"]:
+        rule_id = self.tree.rules[self.index]
+        return None if rule_id < 0 else self.tree.rules_table[rule_id]
+
+    @property
+    def span(self) -> Tuple[int, int]:
+        return self.tree.starts[self.index], self.tree.ends[self.index]
+
+    def tokens(self) -> Sequence[str]:
+        start, end = self.span
+        return self.tree.word[start:end]
+
+    def is_token(self) -> bool:
+        return self.tree.rules[self.index] < 0
+
+    def __len__(self) -> int:
+        rule = self.rule
+        return 0 if rule is None else len(rule.right_symbols)
+
+    def children(self) -> Iterator["ParseNode"]:
+        child = self.index + 1
+        for _ in range(len(self)):
+            yield ParseNode(self.tree, child)
+            child = self.tree.subtree_ends[child]
+
+    def __getitem__(self, position: int) -> "ParseNode":
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        child = self.index + 1
+        for _ in range(position):
+            child = self.tree.subtree_ends[child]
+        return ParseNode(self.tree, child)
+
+    def __repr__(self) -> str:
+        return f"ParseNode({self.symbol}, span={self.span})"
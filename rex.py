@@ -1,30 +1,147 @@
+from typing import Dict, List, Tuple, Sequence, Set, Optional
+from collections import OrderedDict
+from array import array
+from itertools import count
+from threading import Lock
+from weakref import WeakValueDictionary
 from msp import LTS, LabelledTransition
+from dfa import DFA
 
 
 class ReX:
+    """
+    Matching works on Brzozowski derivatives of hash-consed expressions:
+    ``canonical()`` maps an expression to its unique interned form (built by
+    the smart constructors below), so structurally equal expressions are the
+    same object and ``derivative`` results can be memoized by identity.
+
+    Interned nodes are held weakly and every node keeps its own derivatives,
+    so nodes and derivatives of a pattern nobody uses any more are freed
+    instead of piling up in process-wide tables.
+    """
+
     def __str__(self) -> str:
         pass
 
-    def accepts(self, string: str) -> bool:
+    def __intern__(self) -> "ReX":
+        pass
+
+    def __derive__(self, symbol: str) -> "ReX":
         pass
 
+    def canonical(self) -> "ReX":
+        canonical = getattr(self, "canonical_node", None)
+        if canonical is None:
+            canonical = self.__intern__()
+            self.canonical_node = canonical
+        return canonical
+
+    def derivative(self, symbol: str) -> "ReX":
+        node = self.canonical()
+
+        result = node.derivatives.get(symbol)
+        if result is None:
+            result = node.derivatives[symbol] = node.__derive__(symbol)
+        return result
+
+    def accepts(self, string: Sequence[str]) -> bool:
+        node = self.canonical()
+
+        for symbol in string:
+            node = node.derivative(symbol)
+            if node is EMPTY:
+                return False
+
+        return node.nullable
+
+    def to_dfa(self) -> DFA:
+        """
+        Explores the derivatives of this expression over its own symbols;
+        every distinct derivative becomes one DFA state.
+        """
+        labels: Set[str] = set()
+        stack: List[ReX] = [self.canonical()]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Symbol):
+                labels.add(node.symb)
+            elif isinstance(node, Union):
+                stack.extend([node.left_rex, node.right_rex])
+            elif isinstance(node, KleneeStar):
+                stack.append(node.rex)
+
+        label_ids = {label: i for i, label in enumerate(sorted(labels))}
+        state_ids: Dict[ReX, int] = {self.canonical(): 0}
+        states: List[ReX] = [self.canonical()]
+        table = array("i")
+
+        current = 0
+        while current < len(states):
+            node = states[current]
+            current += 1
+
+            for label in label_ids:
+                target = node.derivative(label)
+                if target is EMPTY:
+                    table.append(DFA.dead)
+                    continue
+
+                if target not in state_ids:
+                    state_ids[target] = len(states)
+                    states.append(target)
+                table.append(state_ids[target])
+
+        return DFA(0, label_ids, table, [node.nullable for node in states])
+
     def rex2lts(self, first_state: int = 0) -> LTS:
-        label = self.__str__()
-        start, end = first_state, first_state + 1
+        transitions: List[LabelledTransition] = list()
+        start, end = self.__add_transitions__(first_state, transitions)
 
         return LTS(start,
                    end,
-                   set(range(start, end + 1)),
-                   {LabelledTransition(start, end, label, )},
+                   range(start, end + 1),
+                   transitions,
                    )
 
+    def __add_transitions__(self, first_state: int, transitions: List[LabelledTransition]) -> Tuple[int, int]:
+        """
+        Appends the automaton of this expression, numbered from
+        ``first_state``, to ``transitions`` and returns its start and end.
+        """
+        label = self.__str__()
+        start, end = first_state, first_state + 1
+
+        transitions.append(LabelledTransition(start, end, label, ))
+        return start, end
+
+
+class Empty(ReX):
+    """
+    The empty language; only produced by derivatives.
+    """
+
+    def __str__(self) -> str:
+        return "∅"
+
+    def __intern__(self) -> ReX:
+        return EMPTY
+
+    def __derive__(self, symbol: str) -> ReX:
+        return EMPTY
+
+    def __add_transitions__(self, first_state: int, transitions: List[LabelledTransition]) -> Tuple[int, int]:
+        return first_state, first_state + 1
+
 
 class Epsilon(ReX):
     def __str__(self) -> str:
         return ""
 
-    def accepts(self, string: str) -> bool:
-        return not string
+    def __intern__(self) -> ReX:
+        return EPSILON
+
+    def __derive__(self, symbol: str) -> ReX:
+        return EMPTY
 
 
 class Symbol(ReX):
@@ -34,8 +151,11 @@ class Symbol(ReX):
     def __str__(self) -> str:
         return self.symb
 
-    def accepts(self, string: str) -> bool:
-        return self.symb == string
+    def __intern__(self) -> ReX:
+        return make_symbol(self.symb)
+
+    def __derive__(self, symbol: str) -> ReX:
+        return EPSILON if self.symb == symbol else EMPTY
 
 
 class Union(ReX):
@@ -43,69 +163,119 @@ class Union(ReX):
         self.left_rex = left_rex
         self.right_rex = right_rex
 
+    def __alternatives__(self) -> List[ReX]:
+        """
+        The operands of this chain of unions, nested either way, left to
+        right; derivatives and ``|`` patterns chain as many as there are
+        alternatives.
+        """
+        alternatives: List[ReX] = list()
+        stack: List[ReX] = [self]
+        while stack:
+            node = stack.pop()
+            if type(node) is Union:
+                stack.append(node.right_rex)
+                stack.append(node.left_rex)
+            else:
+                alternatives.append(node)
+        return alternatives
+
     def __str__(self) -> str:
-        return f"{self.left_rex}|{self.right_rex}"
+        return "|".join(str(alternative) for alternative in self.__alternatives__())
 
-    def accepts(self, string: str) -> bool:
-        return self.left_rex.accepts(string) or self.right_rex.accepts(string)
+    def __intern__(self) -> ReX:
+        return make_union(*[alternative.canonical() for alternative in self.__alternatives__()])
 
-    def rex2lts(self, first_state: int = 0) -> LTS:
+    def __derive__(self, symbol: str) -> ReX:
+        return make_union(*[alternative.derivative(symbol) for alternative in self.__alternatives__()])
+
+    def __add_transitions__(self, first_state: int, transitions: List[LabelledTransition]) -> Tuple[int, int]:
         """
         startState ->  ltsLeft.startState     ltsLeft.endState
             |                                        |
             |                                    endState
             |                                        |
         ltsRight                                ltsRight
+
+        with one branch per alternative of the chain.
         """
-        lts_left = self.left_rex.rex2lts(first_state + 1)
-        lts_right = self.right_rex.rex2lts(
-            first_state + 1 + len(lts_left.states))
-        start, end = first_state, lts_right.end + 1
-        transitions = lts_left.transitions
-
-        transitions.update(lts_right.transitions)
-        transitions.add(LabelledTransition(start, lts_left.start, "", ))
-        transitions.add(LabelledTransition(start, lts_right.start, "", ))
-        transitions.add(LabelledTransition(lts_left.end, end, "", ))
-        transitions.add(LabelledTransition(lts_right.end, end, "", ))
+        start = first_state
+        branches: List[Tuple[int, int]] = list()
+        next_state = first_state + 1
+        for alternative in self.__alternatives__():
+            branch = alternative.__add_transitions__(next_state, transitions)
+            branches.append(branch)
+            next_state = branch[1] + 1
+        end = next_state
 
-        return LTS(start,
-                   end,
-                   set(range(start, end + 1)),
-                   transitions, )
+        for branch_start, branch_end in branches:
+            transitions.append(LabelledTransition(start, branch_start, "", ))
+            transitions.append(LabelledTransition(branch_end, end, "", ))
+
+        return start, end
 
 
 class Concatenation(Union):
+    """
+    Long patterns give chains of concatenations as deep as the pattern is
+    long, so the methods below walk the chain with ``__parts__`` instead of
+    recursing into ``right_rex``.
+    """
+
     def __init__(self, left_rex: ReX, right_rex: ReX):
         super().__init__(left_rex, right_rex)
 
-    def __str__(self) -> str:
-        return f"{self.left_rex},{self.right_rex}"
-
-    def accepts(self, string: str) -> bool:
-        for left_part_size in range(len(string) + 1):
-            left_string, right_string = string[:left_part_size], string[left_part_size:]
-            if self.left_rex.accepts(left_string) and self.right_rex.accepts(right_string):
-                return True
-        return False
+    def __parts__(self) -> List[ReX]:
+        """
+        The operands of this chain of concatenations, left to right.
+        """
+        parts: List[ReX] = list()
+        stack: List[ReX] = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Concatenation):
+                stack.append(node.right_rex)
+                stack.append(node.left_rex)
+            else:
+                parts.append(node)
+        return parts
 
-    def rex2lts(self, first_state: int = 0) -> LTS:
+    def __str__(self) -> str:
+        return ",".join(str(part) for part in self.__parts__())
+
+    def __intern__(self) -> ReX:
+        parts = self.__parts__()
+        result = parts[-1].canonical()
+        for part in reversed(parts[:-1]):
+            result = make_concatenation(part.canonical(), result)
+        return result
+
+    def __derive__(self, symbol: str) -> ReX:
+        # d(l,r) = d(l),r | d(r) when l is nullable, unrolled along the chain
+        alternatives: List[ReX] = list()
+        node: ReX = self
+        while type(node) is Concatenation:
+            alternatives.append(make_concatenation(node.left_rex.derivative(symbol), node.right_rex))
+            if not node.left_rex.nullable:
+                break
+            node = node.right_rex
+        else:
+            alternatives.append(node.derivative(symbol))
+
+        return make_union(*alternatives)
+
+    def __add_transitions__(self, first_state: int, transitions: List[LabelledTransition]) -> Tuple[int, int]:
         """
          ltsLeft.endState -> ltsRight.startState
         """
-        lts_left = self.left_rex.rex2lts(0)
-        lts_right = self.right_rex.rex2lts(first_state + len(lts_left.states))
-        start, end = lts_left.start, lts_right.end
-        transitions = lts_left.transitions
+        parts = self.__parts__()
+        start, end = parts[0].__add_transitions__(first_state, transitions)
+        for part in parts[1:]:
+            part_start, part_end = part.__add_transitions__(end + 1, transitions)
+            transitions.append(LabelledTransition(end, part_start, "", ))
+            end = part_end
 
-        transitions.update(lts_right.transitions)
-        transitions.add(LabelledTransition(lts_left.end, lts_right.start, "", ))
-        return LTS(
-            start,
-            end,
-            set(range(start, end + 1)),
-            transitions,
-        )
+        return start, end
 
 
 class KleneeStar(ReX):
@@ -115,31 +285,288 @@ class KleneeStar(ReX):
     def __str__(self) -> str:
         return f"{self.rex}*"
 
-    def accepts(self, string: str) -> bool:
-        if not string:
-            return True
+    def __intern__(self) -> ReX:
+        return make_klenee_star(self.rex.canonical())
 
-        for left_part_size in range(len(string) + 1):
-            left_string, right_string = string[:left_part_size], string[left_part_size:]
-            if self.rex.accepts(left_string) and self.accepts(right_string):
-                return True
-        return False
+    def __derive__(self, symbol: str) -> ReX:
+        return make_concatenation(self.rex.derivative(symbol), self)
 
-    def rex2lts(self, first_state: int = 0) -> LTS:
+    def __add_transitions__(self, first_state: int, transitions: List[LabelledTransition]) -> Tuple[int, int]:
         """
         startState ->  lts.startState <-> lts.endState -> endState
         """
-        lts_inner = self.rex.rex2lts(first_state + 1)
-        start, end = first_state, lts_inner.end + 1
-        transitions = lts_inner.transitions
+        inner_start, inner_end = self.rex.__add_transitions__(first_state + 1, transitions)
+        start, end = first_state, inner_end + 1
 
-        transitions.add(LabelledTransition(start, lts_inner.start, "", ))
-        transitions.add(LabelledTransition(lts_inner.end, end, "", ))
-        transitions.add(LabelledTransition(lts_inner.end, lts_inner.start, "", ))
-        transitions.add(LabelledTransition(lts_inner.start, lts_inner.end, "", ))
+        transitions.append(LabelledTransition(start, inner_start, "", ))
+        transitions.append(LabelledTransition(inner_end, end, "", ))
+        transitions.append(LabelledTransition(inner_end, inner_start, "", ))
+        transitions.append(LabelledTransition(inner_start, inner_end, "", ))
+
+        return start, end
+
+
+# keys name children by intern id: holding the children themselves would
+# keep alive every node a derivative of theirs leads back to
+interned_nodes: "WeakValueDictionary[tuple, ReX]" = WeakValueDictionary()
+# ids are never reused, so the key of a freed node matches nothing again
+intern_ids = count()
+
+
+def hash_cons(node: ReX, key: tuple, nullable: bool) -> ReX:
+    existing = interned_nodes.get(key)
+    if existing is not None:
+        return existing
+
+    node.intern_id = next(intern_ids)
+    node.nullable = nullable
+    node.canonical_node = node
+    node.derivatives = dict()
+    interned_nodes[key] = node
+    return node
+
+
+EMPTY = hash_cons(Empty(), (Empty,), False)
+EPSILON = hash_cons(Epsilon(), (Epsilon,), True)
+
+
+def make_symbol(symb: str) -> ReX:
+    return hash_cons(Symbol(symb), (Symbol, symb), False)
+
+
+def make_union(*nodes: ReX) -> ReX:
+    """
+    Alternatives are flattened, deduplicated, stripped of EMPTY and sorted
+    by intern id, so that union is associative, commutative and idempotent
+    on interned nodes and every expression has finitely many derivatives.
+    Takes any number of operands, so a chain is flattened once.
+    """
+    alternatives: Dict[int, ReX] = dict()
+    for node in nodes:
+        while type(node) is Union:
+            alternatives[node.left_rex.intern_id] = node.left_rex
+            node = node.right_rex
+        if node is not EMPTY:
+            alternatives[node.intern_id] = node
+
+    if not alternatives:
+        return EMPTY
+
+    ordered = [alternatives[intern_id] for intern_id in sorted(alternatives)]
+    result = ordered[-1]
+    for node in reversed(ordered[:-1]):
+        result = hash_cons(Union(node, result), (Union, node.intern_id, result.intern_id), node.nullable or result.nullable)
+    return result
+
+
+def make_concatenation(left: ReX, right: ReX) -> ReX:
+    if left is EMPTY or right is EMPTY:
+        return EMPTY
+    if left is EPSILON:
+        return right
+    if right is EPSILON:
+        return left
+    if type(left) is Concatenation:
+        # interned chains nest to the right, so their operands are never
+        # concatenations and each call below returns without recursing
+        result = right
+        for part in reversed(left.__parts__()):
+            result = make_concatenation(part, result)
+        return result
+
+    return hash_cons(Concatenation(left, right), (Concatenation, left.intern_id, right.intern_id), left.nullable and right.nullable)
+
+
+def make_klenee_star(rex: ReX) -> ReX:
+    if rex is EMPTY or rex is EPSILON:
+        return EPSILON
+    if type(rex) is KleneeStar:
+        return rex
+
+    return hash_cons(KleneeStar(rex), (KleneeStar, rex.intern_id), True)
+
+
+class RexSyntaxError(ValueError):
+    def __init__(self, message: str, pattern: str, position: int):
+        super().__init__(f"{message} at position {position} in {pattern!r}")
+        self.pattern = pattern
+        self.position = position
+
+
+class RexSyntaxParser:
+    """
+    Recursive descent parser for the concrete syntax::
+
+        alternation := concatenation ('|' concatenation)*
+        concatenation := repetition*
+        repetition := atom ('*' | '+' | '?')*
+        atom := char | '\\' char | '(' alternation ')' | '[' class ']'
+
+    ``a+`` is lowered to ``a,a*``, ``a?`` to ``a|`` and ``[a-cx]`` to
+    ``a|b|c|x``, so only the existing node types are produced.
+    """
+    special = set("|*+?()[]\\")
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.position = 0
+
+    def __peek__(self) -> Optional[str]:
+        return self.pattern[self.position] if self.position < len(self.pattern) else None
+
+    def __next_char__(self) -> str:
+        char = self.__peek__()
+        if char is None:
+            raise RexSyntaxError("unexpected end of pattern", self.pattern, self.position)
+        self.position += 1
+        return char
+
+    def parse(self) -> ReX:
+        rex = self.__parse_alternation__()
+        if self.position != len(self.pattern):
+            raise RexSyntaxError(f"unexpected {self.__peek__()!r}", self.pattern, self.position)
+        return rex
+
+    def __parse_alternation__(self) -> ReX:
+        rex = self.__parse_concatenation__()
+        while self.__peek__() == "|":
+            self.position += 1
+            rex = Union(rex, self.__parse_concatenation__())
+        return rex
+
+    def __parse_concatenation__(self) -> ReX:
+        parts: List[ReX] = list()
+        while self.__peek__() is not None and self.__peek__() not in "|)":
+            parts.append(self.__parse_repetition__())
+
+        if not parts:
+            return Epsilon()
+
+        rex = parts[-1]
+        for part in reversed(parts[:-1]):
+            rex = Concatenation(part, rex)
+        return rex
+
+    def __parse_repetition__(self) -> ReX:
+        rex = self.__parse_atom__()
+        while self.__peek__() is not None and self.__peek__() in "*+?":
+            operator = self.__next_char__()
+            if operator == "*":
+                rex = KleneeStar(rex)
+            elif operator == "+":
+                rex = Concatenation(rex, KleneeStar(rex))
+            else:
+                rex = Union(rex, Epsilon())
+        return rex
+
+    def __parse_atom__(self) -> ReX:
+        start = self.position
+        char = self.__next_char__()
+
+        if char == "(":
+            rex = self.__parse_alternation__()
+            if self.__peek__() != ")":
+                raise RexSyntaxError("missing ')'", self.pattern, start)
+            self.position += 1
+            return rex
+        if char == "[":
+            return self.__parse_class__(start)
+        if char == "\\":
+            return Symbol(self.__next_char__())
+        if char in RexSyntaxParser.special:
+            raise RexSyntaxError(f"unexpected {char!r}", self.pattern, start)
+        return Symbol(char)
+
+    def __parse_class__(self, start: int) -> ReX:
+        chars: List[str] = list()
+
+        while self.__peek__() != "]":
+            if self.__peek__() is None:
+                raise RexSyntaxError("missing ']'", self.pattern, start)
+
+            char = self.__next_char__()
+            if char == "\\":
+                char = self.__next_char__()
+
+            if self.__peek__() == "-" and self.position + 1 < len(self.pattern) \
+                    and self.pattern[self.position + 1] != "]":
+                self.position += 1
+                last = self.__next_char__()
+                if last == "\\":
+                    last = self.__next_char__()
+                if ord(last) < ord(char):
+                    raise RexSyntaxError(f"bad range {char}-{last}", self.pattern, start)
+                chars.extend(chr(code) for code in range(ord(char), ord(last) + 1))
+            else:
+                chars.append(char)
+        self.position += 1
+
+        if not chars:
+            raise RexSyntaxError("empty character class", self.pattern, start)
+
+        unique = sorted(set(chars))
+        rex: ReX = Symbol(unique[-1])
+        for char in reversed(unique[:-1]):
+            rex = Union(Symbol(char), rex)
+        return rex
+
+
+def parse(pattern: str) -> ReX:
+    return RexSyntaxParser(pattern).parse()
+
+
+class PatternCache:
+    """
+    LRU cache of compiled patterns keyed by pattern text. The table and the
+    counters are only touched under ``lock``; compiling a missing pattern
+    happens outside it, so a slow pattern does not hold up other lookups.
+    """
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self.compiled: "OrderedDict[str, DFA]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, pattern: str) -> DFA:
+        with self.lock:
+            dfa = self.compiled.get(pattern)
+            if dfa is not None:
+                self.hits += 1
+                self.compiled.move_to_end(pattern)
+                return dfa
+            self.misses += 1
+
+        dfa = parse(pattern).rex2lts().compile()
+        with self.lock:
+            if self.max_size > 0:
+                # keep the copy of a thread that compiled it first
+                dfa = self.compiled.setdefault(pattern, dfa)
+                self.__evict__()
+        return dfa
+
+    def resize(self, max_size: int):
+        with self.lock:
+            self.max_size = max_size
+            self.__evict__()
+
+    def __evict__(self):
+        while len(self.compiled) > max(self.max_size, 0):
+            self.compiled.popitem(last=False)
+
+    def purge(self):
+        with self.lock:
+            self.compiled.clear()
+
+
+pattern_cache = PatternCache()
+
+
+def compile(pattern: str) -> DFA:
+    """
+    Parses ``pattern`` and returns its minimal DFA, built once per process
+    while the pattern stays in ``pattern_cache``.
+    """
+    return pattern_cache.get(pattern)
 
-        return LTS(start,
-                   end,
-                   set(range(start, end + 1)),
-                   transitions,
-                   )
@@ -0,0 +1,86 @@
+from typing import Callable, Dict, Hashable, Iterable, List, TypeVar
+
+Node = TypeVar("Node", bound=Hashable)
+
+
+def strongly_connected_components(nodes: Iterable[Node],
+                                  successors: Callable[[Node], Iterable[Node]],
+                                  ) -> List[List[Node]]:
+    """
+    Iterative Tarjan algorithm. Components come out in reverse topological
+    order: every component is listed after all components it can reach.
+    """
+    index: Dict[Node, int] = dict()
+    low_link: Dict[Node, int] = dict()
+    on_stack: Dict[Node, bool] = dict()
+    stack: List[Node] = list()
+    components: List[List[Node]] = list()
+
+    for root in nodes:
+        if root in index:
+            continue
+
+        index[root] = low_link[root] = len(index)
+        stack.append(root)
+        on_stack[root] = True
+        call_stack = [(root, iter(successors(root)))]
+
+        while call_stack:
+            node, children = call_stack[-1]
+            descended = False
+
+            for child in children:
+                if child not in index:
+                    index[child] = low_link[child] = len(index)
+                    stack.append(child)
+                    on_stack[child] = True
+                    call_stack.append((child, iter(successors(child))))
+                    descended = True
+                    break
+                if on_stack.get(child):
+                    low_link[node] = min(low_link[node], index[child])
+
+            if descended:
+                continue
+
+            call_stack.pop()
+            if call_stack:
+                parent = call_stack[-1][0]
+                low_link[parent] = min(low_link[parent], low_link[node])
+
+            if low_link[node] == index[node]:
+                component: List[Node] = list()
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+
+def union_over_reachable(nodes: Iterable[Node],
+                         successors: Callable[[Node], Iterable[Node]],
+                         initial: Dict[Node, int],
+                         ) -> Dict[Node, int]:
+    """
+    For every node, the bitwise or of ``initial`` over all nodes reachable
+    from it (itself included). Each component is solved once, after the
+    components it reaches, as in the DeRemer-Pennello digraph algorithm.
+    """
+    values: Dict[Node, int] = dict()
+
+    for component in strongly_connected_components(nodes, successors):
+        members = set(component)
+        value = 0
+        for member in component:
+            value |= initial.get(member, 0)
+            for successor in successors(member):
+                if successor not in members:
+                    value |= values[successor]
+        for member in component:
+            values[member] = value
+
+    return values
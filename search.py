@@ -0,0 +1,262 @@
+import re
+import mmap
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from dfa import DFA
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+class Match:
+    __slots__ = ("buffer", "start", "end")
+
+    def __init__(self, buffer: Buffer, start: int, end: int):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+
+    def span(self):
+        return self.start, self.end
+
+    def group(self) -> bytes:
+        return bytes(self.buffer[self.start:self.end])
+
+    def __repr__(self) -> str:
+        return f"Match(span={self.span()})"
+
+
+class ReachableAhead:
+    """
+    For every position ``j`` of ``buffer[pos:endpos + 1]``, the set of
+    searcher states from which a final state can still be reached by reading
+    on from ``j`` without passing ``endpos``. Sets are interned as states of
+    a reverse automaton owned by the searcher, and filled by one backward
+    pass; only the ids at block boundaries are kept from it, a block's ids
+    are recomputed from its right boundary when it is visited, so memory is
+    O(block_size + length / block_size).
+    """
+
+    def __init__(self, searcher: "ByteSearcher", buffer: Buffer, pos: int, endpos: int, block_size: int = 1 << 16):
+        self.searcher = searcher
+        self.buffer = buffer
+        self.pos = pos
+        self.endpos = endpos
+        self.block_size = block_size
+
+        # right_ids[k]: id at the right end of block k
+        blocks_count = max(1, -(-(endpos - pos) // block_size))
+        self.right_ids = array("i", [0]) * blocks_count
+        reach = searcher.finals_reach
+        self.right_ids[blocks_count - 1] = reach
+        for position in range(endpos - 1, pos - 1, -1):
+            reach = searcher.__reach_step__(reach, buffer[position])
+            offset = position - pos
+            if offset and offset % block_size == 0:
+                self.right_ids[offset // block_size - 1] = reach
+
+        self.block = -1
+        self.block_ids = array("i")
+
+    def ids_from(self, position: int) -> Tuple[int, int, array]:
+        """
+        The block holding ``position``: its first position, last position
+        and the reach ids of all its positions.
+        """
+        block = min((position - self.pos) // self.block_size, len(self.right_ids) - 1)
+        low = self.pos + block * self.block_size
+        high = min(low + self.block_size, self.endpos)
+
+        if block != self.block:
+            reach = self.right_ids[block]
+            ids = array("i", [0]) * (high - low + 1)
+            ids[high - low] = reach
+            for position in range(high - 1, low - 1, -1):
+                reach = self.searcher.__reach_step__(reach, self.buffer[position])
+                ids[position - low] = reach
+            self.block, self.block_ids = block, ids
+
+        return low, high, self.block_ids
+
+
+class ByteSearcher:
+    """
+    Unanchored leftmost-longest search of a compiled DFA over byte buffers.
+
+    Every byte is the label ``chr(byte)``, as in ``StreamMatcher``. The DFA
+    table is re-laid out with 256 columns per state so the inner loop is a
+    single list lookup per byte. Candidate start positions are found with a
+    one-byte-class ``re`` scan, which runs over the buffer without copying it.
+
+    Scanning forward from each candidate is fast when the DFA dies quickly,
+    but may rescan the same bytes for every candidate. Once the rescanned
+    bytes exceed ``rescan_factor`` times the length searched, the search
+    switches to ``ReachableAhead``: starts are the positions where the start
+    state can still reach a final one, and each forward scan stops exactly
+    at the longest match end, so no byte is scanned forward twice.
+    """
+    dead = -1
+    unknown = -2
+    rescan_factor = 4
+    rescan_slack = 1 << 12
+
+    def __init__(self, dfa: "DFA"):
+        self.start = dfa.start
+        self.finals = list(dfa.finals)
+
+        width = len(dfa.labels)
+        byte_labels = [dfa.labels.get(chr(byte)) for byte in range(256)]
+        self.table: List[int] = list()
+        for state in range(dfa.states_count):
+            for label_id in byte_labels:
+                self.table.append(ByteSearcher.dead if label_id is None else dfa.table[state * width + label_id])
+
+        self.matches_empty = self.finals[self.start]
+        first_bytes = bytes(byte for byte in range(256) if self.table[self.start * 256 + byte] >= 0)
+        # a pattern that matches the empty string may start anywhere;
+        # one that cannot leave the start state never matches at all
+        self.prefilter: Optional[re.Pattern] = None
+        if not self.matches_empty and first_bytes:
+            self.prefilter = re.compile(b"[" + b"".join(re.escape(bytes([byte])) for byte in first_bytes) + b"]")
+
+        # reverse automaton for ReachableAhead: states are bitsets of
+        # searcher states, built on demand with 256 columns each
+        self.reach_sets: List[int] = list()
+        self.reach_ids: Dict[int, int] = dict()
+        self.reach_table: List[int] = list()
+        self.finals_reach = self.__intern_reach__(
+            sum(1 << state for state, final in enumerate(self.finals) if final))
+
+    def __intern_reach__(self, reach_set: int) -> int:
+        reach = self.reach_ids.get(reach_set)
+        if reach is None:
+            reach = self.reach_ids[reach_set] = len(self.reach_sets)
+            self.reach_sets.append(reach_set)
+            self.reach_table.extend([ByteSearcher.unknown] * 256)
+        return reach
+
+    def __reach_step__(self, reach: int, byte: int) -> int:
+        """
+        Reach id one byte earlier: a final state, or one whose step on
+        ``byte`` lands in ``reach``.
+        """
+        previous = self.reach_table[(reach << 8) | byte]
+        if previous == ByteSearcher.unknown:
+            reach_set = self.reach_sets[reach]
+            previous_set = self.reach_sets[self.finals_reach]
+            for state in range(len(self.finals)):
+                target = self.table[(state << 8) | byte]
+                if target >= 0 and reach_set >> target & 1:
+                    previous_set |= 1 << state
+            previous = self.reach_table[(reach << 8) | byte] = self.__intern_reach__(previous_set)
+        return previous
+
+    def __longest_from__(self, buffer: Buffer, position: int, endpos: int) -> Tuple[int, int]:
+        """
+        Longest match end from ``position`` (-1 if none) and where the
+        scan stopped.
+        """
+        table, finals = self.table, self.finals
+        state = self.start
+        last_end = position if finals[state] else -1
+
+        current = position
+        while current < endpos:
+            state = table[(state << 8) | buffer[current]]
+            if state < 0:
+                break
+            current += 1
+            if finals[state]:
+                last_end = current
+
+        return last_end, current
+
+    def __linear_search__(self, ahead: ReachableAhead, pos: int) -> Optional[Match]:
+        buffer, endpos = ahead.buffer, ahead.endpos
+        table, finals, reach_sets = self.table, self.finals, self.reach_sets
+
+        while pos <= endpos:
+            if not self.matches_empty:
+                if self.prefilter is None:
+                    return None
+                candidate = self.prefilter.search(buffer, pos, endpos)
+                if candidate is None:
+                    return None
+                pos = candidate.start()
+
+            low, high, ids = ahead.ids_from(pos)
+            if reach_sets[ids[pos - low]] >> self.start & 1:
+                break
+            pos += 1
+        else:
+            return None
+
+        state, current = self.start, pos
+        last_end = pos if finals[state] else -1
+        while current < endpos:
+            state = table[(state << 8) | buffer[current]]
+            if state < 0:
+                break
+            current += 1
+            if current > high:
+                low, high, ids = ahead.ids_from(current)
+            if not reach_sets[ids[current - low]] >> state & 1:
+                break
+            if finals[state]:
+                last_end = current
+
+        return Match(buffer, pos, last_end)
+
+    def search(self, buffer: Buffer, pos: int = 0, endpos: Optional[int] = None) -> Optional[Match]:
+        for match in self.finditer(buffer, pos, endpos):
+            return match
+        return None
+
+    def finditer(self, buffer: Buffer, pos: int = 0, endpos: Optional[int] = None) -> Iterator[Match]:
+        endpos = len(buffer) if endpos is None else min(endpos, len(buffer))
+        allowance = ByteSearcher.rescan_factor * max(endpos - pos, 0) + ByteSearcher.rescan_slack
+        ahead: Optional[ReachableAhead] = None
+
+        while pos <= endpos:
+            match: Optional[Match] = None
+
+            while ahead is None and pos <= endpos:
+                if not self.matches_empty:
+                    if self.prefilter is None:
+                        return
+                    candidate = self.prefilter.search(buffer, pos, endpos)
+                    if candidate is None:
+                        return
+                    pos = candidate.start()
+
+                end, stopped = self.__longest_from__(buffer, pos, endpos)
+                allowance -= stopped - pos + 1
+                if end >= 0:
+                    match = Match(buffer, pos, end)
+                    break
+                pos += 1
+                if allowance < 0:
+                    ahead = ReachableAhead(self, buffer, pos, endpos)
+
+            if match is None and ahead is not None:
+                match = self.__linear_search__(ahead, pos)
+            if match is None:
+                return
+
+            yield match
+            # an empty match must not be found again at the same place
+            pos = match.end if match.end > match.start else match.end + 1
+            if ahead is None and allowance < 0:
+                ahead = ReachableAhead(self, buffer, pos, endpos)
+
+    def finditer_file(self, path: str) -> Iterator[Match]:
+        """
+        Matches refer to the mapped file, which is closed once the
+        iteration ends; call ``group()`` while iterating.
+        """
+        with open(path, "rb") as file:
+            if not file.seek(0, 2):
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield from self.finditer(buffer)
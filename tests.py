@@ -1,4 +1,20 @@
+import gc
+import threading
+from typing import List
 from rex import Symbol, KleneeStar, Union, Concatenation
+from search import ByteSearcher
+from msp import LTS
+import rex
+from lexer import Lexer
+from cfg import ContextFreeGrammar
+from grammar_symbol import Terminal, NonTerminal, FromNonTerminal
+from grammar_rule import GrammarRule
+from my_parser import Parser, ParseError
+from compact_cfg import CompactGrammar
+from scc import union_over_reachable
+from earley import EarleyRecognizer
+from cyk import CYKRecognizer
+from lalr import LALRParser
 
 if __name__ == "__main__":
     a_lts = Symbol('a').rex2lts()
@@ -23,3 +39,453 @@ if __name__ == "__main__":
     assert ab_star_lts.accepts("")
     assert ab_star_lts.accepts("ababab")
     assert not ab_star_lts.accepts("aaaa")
+
+    ab_star_dfa = ab_star_lts.determinize()
+    assert ab_star_dfa.accepts("")
+    assert ab_star_dfa.accepts("ababab")
+    assert not ab_star_dfa.accepts("aaaa")
+    assert not ab_star_dfa.accepts("abc")
+
+    nested = Concatenation(concat, Union(Symbol("c"), KleneeStar(Symbol("d"))))
+    nested_lts = nested.rex2lts()
+    nested_dfa = nested_lts.determinize()
+    for chain in ["ab", "abc", "abddd", "abcd", "cd", "a", "abdc"]:
+        assert nested_lts.accepts(chain) == nested_dfa.accepts(chain) == nested.accepts(chain)
+
+    minimal_dfa = nested_lts.compile()
+    assert minimal_dfa.states_count <= nested_dfa.states_count
+    for chain in ["ab", "abc", "abddd", "abcd", "cd", "a", "abdc"]:
+        assert minimal_dfa.accepts(chain) == nested_dfa.accepts(chain)
+
+    a_or_a_star = KleneeStar(Union(Symbol("a"), Symbol("a"))).rex2lts().compile()
+    assert a_or_a_star.states_count == 1
+    assert a_or_a_star.accepts("aaa")
+
+    lazy_dfa = nested_lts.lazy_determinize(max_states=3)
+    for chain in ["ab", "abc", "abddd", "abcd", "cd", "a", "abdc", "abddd"]:
+        assert lazy_dfa.accepts(chain) == nested_dfa.accepts(chain)
+    assert lazy_dfa.states_count <= 3
+    assert lazy_dfa.hits > 0 and lazy_dfa.misses > 0 and lazy_dfa.flushes > 0
+
+    ab_star_bits = ab_star_lts.bit_parallel()
+    assert ab_star_bits.is_final(ab_star_bits.start)
+    assert not ab_star_bits.step(ab_star_bits.start, "b")
+    assert not ab_star_bits.is_final(ab_star_bits.step(ab_star_bits.start, "a"))
+
+    for automaton in [ab_star_lts, ab_star_dfa, ab_star_lts.compile(), ab_star_lts.lazy_determinize()]:
+        stream = automaton.matcher()
+        assert stream.is_accepting()
+        stream.feed("aba")
+        assert not stream.is_accepting() and not stream.is_dead()
+        stream.feed(b"bab")
+        assert stream.is_accepting() and stream.consumed == 6
+        stream.feed("c")
+        assert stream.is_dead() and not stream.feed("ab").is_accepting()
+        stream.reset()
+        assert stream.is_accepting()
+
+    ab_searcher = ByteSearcher(ab_star_lts.compile())
+    assert [m.span() for m in ab_searcher.finditer(b"xabab-ab")] == [(0, 0), (1, 5), (5, 5), (6, 8), (8, 8)]
+    a_b_searcher = ByteSearcher(ab_concat_lts.compile())
+    assert [m.group() for m in a_b_searcher.finditer(memoryview(b"aabxab"))] == [b"ab", b"ab"]
+    assert a_b_searcher.search(b"aaaa") is None
+    # long runs that start a failing candidate at every byte
+    a_star_b = ByteSearcher(rex.compile("a*b"))
+    assert a_star_b.search(b"a" * 50000) is None
+    assert a_star_b.search(b"a" * 50000 + b"b").span() == (0, 50001)
+    assert [m.span() for m in a_star_b.finditer(b"a" * 20000 + b"ba" + b"ab")] == [(0, 20001), (20001, 20004)]
+    a_star_bc = ByteSearcher(rex.compile("a*bc|a"))
+    assert [m.span() for m in a_star_bc.finditer(b"a" * 20000 + b"b")] == [(index, index + 1) for index in range(20000)]
+
+    nested_star = KleneeStar(KleneeStar(Symbol("a")))
+    assert nested_star.accepts("a" * 10000)
+    assert not nested_star.accepts("a" * 10000 + "b")
+    assert nested_star.to_dfa().states_count == 1
+    # interned nodes and their derivatives go away with the last pattern using them
+    gc.collect()
+    interned_before = len(rex.interned_nodes)
+    for index in range(50):
+        transient = rex.parse(f"(ab|c{index})*x{index}?")
+        assert transient.accepts(f"ababx{index}") and transient.to_dfa().accepts(f"c{index}x{index}")
+    del transient
+    gc.collect()
+    assert len(rex.interned_nodes) == interned_before
+    assert rex.parse("(ab|c)*").canonical() is rex.parse("(ab|c)*").canonical()
+    assert nested.to_dfa().accepts("abddd") and not nested.to_dfa().accepts("abdc")
+
+    # determinized and minimal state counts of the Thompson automata
+    for pattern, determinized_count, minimal_count in [
+        (Union(Symbol("a"), Symbol("a")), 2, 2),
+        (KleneeStar(Union(Symbol("a"), Symbol("b"))), 3, 1),
+        (Concatenation(KleneeStar(Union(Symbol("a"), Symbol("b"))), Concatenation(Symbol("a"), Symbol("b"))), 4, 3),
+        (KleneeStar(KleneeStar(Concatenation(Symbol("a"), KleneeStar(Symbol("a"))))), 2, 1),
+    ]:
+        minimal = pattern.rex2lts().compile()
+        assert (minimal.minimized_from, minimal.states_count) == (determinized_count, minimal_count)
+        assert pattern.rex2lts().determinize().minimized_from is None
+    compiled = rex.compile("a(b|c)*[x-z]?")
+    assert compiled.accepts("abcbz") and compiled.accepts("a") and not compiled.accepts("abx!")
+    assert rex.compile("a(b|c)*[x-z]?") is compiled
+    assert rex.compile("(ab)+").accepts("abab") and not rex.compile("(ab)+").accepts("")
+    # chains as long as the pattern, well past the recursion limit
+    assert rex.compile("a" * 3000).accepts("a" * 3000) and not rex.compile("a" * 3000).accepts("a" * 2999)
+    assert rex.parse("a" * 3000).accepts("a" * 3000) and not rex.parse("a" * 3000).accepts("a" * 3001)
+    assert rex.parse("a?" * 300).accepts("a" * 300) and not rex.parse("a?" * 300).accepts("a" * 301)
+    alternatives = rex.parse("|".join(f"x{index}" for index in range(3000)))
+    assert alternatives.accepts("x2999") and alternatives.rex2lts().compile().accepts("x1234")
+
+    # every state reaches all later ones by epsilon edges
+    optional_lts = rex.parse("a?" * 500).rex2lts()
+    assert optional_lts.end in optional_lts.closure(optional_lts.start)
+    assert optional_lts.accepts("a" * 500) and not optional_lts.accepts("a" * 501)
+    assert optional_lts.lazy_determinize(8).accepts("a" * 250)
+    optional_dfa = optional_lts.compile()
+    assert optional_dfa.states_count == 501 and optional_dfa.accepts("a" * 77)
+    cached = sum(len(closure) for closure in optional_lts.target_closures.values())
+    assert cached <= (LTS.closure_cache_factor + 1) * optional_lts.size
+
+    lexer = Lexer([
+        ("if", rex.parse("if")),
+        ("id", rex.parse("[a-z]+")),
+        ("n", rex.parse("[0-9]+")),
+        ("+", rex.parse("\\+")),
+        ("*", rex.parse("\\*")),
+        ("(", rex.parse("\\(")),
+        (")", rex.parse("\\)")),
+        ("ws", rex.parse(" +")),
+    ], skip=["ws"])
+    assert [(t.kind, t.text) for t in lexer.tokenize("if iff 12")] == [("if", "if"), ("id", "iff"), ("n", "12")]
+
+    expressions = ContextFreeGrammar(
+        [Terminal("+"), Terminal("*"), Terminal("n"), Terminal("("), Terminal(")")],
+        [NonTerminal("E"), NonTerminal("T"), NonTerminal("F")],
+        [
+            GrammarRule(NonTerminal("E"), [NonTerminal("T"), Terminal("+"), NonTerminal("E")]),
+            GrammarRule(NonTerminal("E"), [NonTerminal("T")]),
+            GrammarRule(NonTerminal("T"), [NonTerminal("F"), Terminal("*"), NonTerminal("T")]),
+            GrammarRule(NonTerminal("T"), [NonTerminal("F")]),
+            GrammarRule(NonTerminal("F"), [Terminal("n")]),
+            GrammarRule(NonTerminal("F"), [Terminal("("), NonTerminal("E"), Terminal(")")]),
+        ],
+        NonTerminal("E")
+    )
+    expression_parser = Parser(expressions)
+    assert expression_parser.is_in_language(lexer.token_kinds("12 + (3 * 45)"))
+    assert not expression_parser.is_in_language(lexer.token_kinds("12 (3 * 45)"))
+
+    assert NonTerminal("E") is NonTerminal("E") and Terminal("E") != NonTerminal("E")
+    assert NonTerminal("E").id != Terminal("E").id
+
+    compact = CompactGrammar.from_grammar(expressions)
+    assert compact.to_grammar().rules_dict[NonTerminal("F")] == expressions.rules_dict[NonTerminal("F")]
+    assert not compact.detect_disappearing_non_terminals()
+    assert compact.first_sets()[NonTerminal("E")] == {Terminal("n"), Terminal("(")}
+    assert compact.follow_sets()[NonTerminal("F")] == {Terminal("*"), Terminal("+"), Terminal(")"), Terminal("$")}
+
+    dead_rules = ContextFreeGrammar(
+        [Terminal("a")],
+        [NonTerminal("S"), NonTerminal("A"), NonTerminal("D"), NonTerminal("U")],
+        [
+            GrammarRule(NonTerminal("S"), [NonTerminal("A")]),
+            GrammarRule(NonTerminal("S"), [NonTerminal("D"), Terminal("a")]),
+            GrammarRule(NonTerminal("A"), [Terminal("a")]),
+            GrammarRule(NonTerminal("D"), [NonTerminal("D")]),
+            GrammarRule(NonTerminal("U"), [Terminal("a")]),
+        ],
+        NonTerminal("S"),
+    ).remove_external_non_terminals()
+    assert dead_rules.non_terminals == [NonTerminal("S"), NonTerminal("A")] and len(dead_rules.rules) == 2
+
+    left_recursive = ContextFreeGrammar(
+        [Terminal("a"), Terminal("b"), Terminal("g")],
+        [NonTerminal("S"), NonTerminal("A"), NonTerminal("C")],
+        [
+            GrammarRule(NonTerminal("A"), [NonTerminal("S"), Terminal("a")]),
+            GrammarRule(NonTerminal("S"), [NonTerminal("A"), Terminal("g")]),
+            GrammarRule(NonTerminal("S"), [Terminal("b")]),
+            GrammarRule(NonTerminal("C"), [NonTerminal("C"), Terminal("a")]),
+            GrammarRule(NonTerminal("C"), [Terminal("a")]),
+        ],
+        NonTerminal("S"),
+    )
+    components = left_recursive.left_recursive_components()
+    assert sorted(sorted(symbol.name for symbol in component) for component in components) == [["A", "S"], ["C"]]
+    assert not left_recursive.remove_left_recursion().detect_left_recursion()
+    assert not expressions.detect_left_recursion()
+
+    builder = left_recursive.to_builder()
+    fresh = builder.fresh_non_terminal(NonTerminal("C"))
+    builder.replace_rules(NonTerminal("C"), [GrammarRule(NonTerminal("C"), [Terminal("a"), fresh])])
+    builder.add_rule(GrammarRule(fresh, []))
+    rebuilt = builder.build()
+    assert fresh in rebuilt.non_terminals and len(rebuilt.rules_dict[NonTerminal("C")]) == 1
+    assert len(left_recursive.rules_dict[NonTerminal("C")]) == 2
+
+    a, b, c, d = Terminal("a"), Terminal("b"), Terminal("c"), Terminal("d")
+    terminal_alternatives = ContextFreeGrammar(
+        [a, b, c, d],
+        [NonTerminal("A")],
+        [
+            GrammarRule(NonTerminal("A"), [a, b, c]),
+            GrammarRule(NonTerminal("A"), [a, b, d]),
+            GrammarRule(NonTerminal("A"), [a]),
+        ],
+        NonTerminal("A"),
+    ).factorize_grammar()
+    assert len(terminal_alternatives.non_terminals) == 3 and len(terminal_alternatives.rules) == 5
+    assert [str(rule) for rule in terminal_alternatives.rules_dict[NonTerminal("A")]] == ["A -> a A(1)"]
+    # A -> a^i b branches at every level, so the trie is 2000 deep
+    deep_prefixes = ContextFreeGrammar(
+        [a, b],
+        [NonTerminal("A")],
+        [GrammarRule(NonTerminal("A"), [a] * length + [b]) for length in range(1, 2001)],
+        NonTerminal("A"),
+    ).factorize_grammar()
+    assert len(deep_prefixes.rules) == 2 * 2000 - 1 and len(deep_prefixes.non_terminals) == 2000
+    assert all(len(rule.right_symbols) <= 2 for rule in deep_prefixes.rules)
+
+    assert expression_parser.is_in_language_with_first_follows("n+(n+n)*n")
+    assert expression_parser.is_in_language_with_first_follows("(n+n)")
+
+    many_nullable = ContextFreeGrammar(
+        [b],
+        [NonTerminal("N"), NonTerminal("B")],
+        [
+            GrammarRule(NonTerminal("N"), [NonTerminal("B"), b] * 10),
+            GrammarRule(NonTerminal("B"), [b]),
+            GrammarRule(NonTerminal("B"), []),
+        ],
+        NonTerminal("N"),
+    )
+    assert len(many_nullable.transform_to_greibach_form().rules) == 2 ** 10 + 1
+    bounded = many_nullable.transform_to_greibach_form(max_nullable=2)
+    assert len(bounded.rules) < 50
+    assert all(rule.right_symbols or rule.left_symbol == bounded.start_non_terminal for rule in bounded.rules)
+
+    assert expression_parser.is_ll1()
+    assert not expression_parser.is_in_language_with_first_follows("n+n)")
+    assert not expression_parser.is_in_language_with_first_follows("n+")
+    assert expression_parser.is_in_language_with_first_follows("(" * 5000 + "n" + ")" * 5000)
+    star = Parser(ContextFreeGrammar(
+        [a, b],
+        [NonTerminal("S")],
+        [GrammarRule(NonTerminal("S"), [a, NonTerminal("S")]), GrammarRule(NonTerminal("S"), [])],
+        NonTerminal("S"),
+    ))
+    assert star.is_ll1() and star.is_in_language_with_first_follows("aaa")
+    assert not star.is_in_language_with_first_follows("ab")
+    conflicting = Parser(ContextFreeGrammar(
+        [a, b, c],
+        [NonTerminal("S"), NonTerminal("A"), NonTerminal("B")],
+        [
+            GrammarRule(NonTerminal("S"), [NonTerminal("A"), a]),
+            GrammarRule(NonTerminal("S"), [NonTerminal("B"), b]),
+            GrammarRule(NonTerminal("A"), [c]),
+            GrammarRule(NonTerminal("B"), [c]),
+        ],
+        NonTerminal("S"),
+    ))
+    assert [(left.name, terminal.name) for left, terminal, _, _ in conflicting.conflicts] == [("S", "c")]
+
+    assert union_over_reachable("abcd", {"a": "b", "b": "a", "c": "a", "d": ""}.__getitem__,
+                                {"a": 1, "b": 2, "c": 4, "d": 8}) == {"a": 3, "b": 3, "c": 7, "d": 8}
+    assert expression_parser.first_dict[NonTerminal("E")] == {Terminal("n"), Terminal("(")}
+    assert expression_parser.follows_dict[NonTerminal("E")] == {Parser.end_symbol, Terminal(")")}
+    assert [str(t) for t in star.first([star.grammar.start_non_terminal, b])] == ["a", "b"]
+    assert star.first([NonTerminal("S"), b]) == [a]
+
+    assert expression_parser.is_in_language_with_earley(lexer.token_kinds("12 + (3 * 45)"))
+    assert not expression_parser.is_in_language_with_earley(lexer.token_kinds("12 (3 * 45)"))
+    ambiguous = EarleyRecognizer(ContextFreeGrammar(
+        [a, b],
+        [NonTerminal("S")],
+        [
+            GrammarRule(NonTerminal("S"), [NonTerminal("S"), NonTerminal("S")]),
+            GrammarRule(NonTerminal("S"), [a]),
+            GrammarRule(NonTerminal("S"), []),
+        ],
+        NonTerminal("S"),
+    ))
+    assert ambiguous.recognize("") and ambiguous.recognize("aaaa") and not ambiguous.recognize("aba")
+    right_recursive = EarleyRecognizer(ContextFreeGrammar(
+        [a],
+        [NonTerminal("S")],
+        [GrammarRule(NonTerminal("S"), [a, NonTerminal("S")]), GrammarRule(NonTerminal("S"), [a])],
+        NonTerminal("S"),
+    ))
+    assert right_recursive.recognize("a" * 10000) and not right_recursive.recognize("")
+
+    assert expression_parser.is_in_language_memoized(lexer.token_kinds("12 + (3 * 45)"))
+    assert not expression_parser.is_in_language_memoized(lexer.token_kinds("12 (3 * 45)"))
+    doubling = Parser(ContextFreeGrammar(
+        [a, b],
+        [NonTerminal("S")],
+        [
+            GrammarRule(NonTerminal("S"), [NonTerminal("S"), NonTerminal("S")]),
+            GrammarRule(NonTerminal("S"), [a]),
+            GrammarRule(NonTerminal("S"), [a, b]),
+        ],
+        NonTerminal("S"),
+    ), max_memo_size=16)
+    assert not doubling.is_in_language_memoized("a" * 12 + "bb")
+    assert doubling.is_in_language_memoized("ab" * 6 + "a")
+    assert doubling.packrat.memo.evictions > 0 and len(doubling.packrat.memo.entries) <= 16
+    assert 0 < doubling.packrat.memo.hit_rate() < 1
+
+    chomsky = expressions.to_chomsky_normal_form()
+    assert all(
+        len(rule.right_symbols) == 2 and all(isinstance(symbol, NonTerminal) for symbol in rule.right_symbols)
+        or len(rule.right_symbols) == 1 and isinstance(rule.right_symbols[0], Terminal)
+        for rule in chomsky.rules
+    )
+    expression_cyk = CYKRecognizer(expressions)
+    assert expression_cyk.recognize(lexer.token_kinds("12 + (3 * 45)"))
+    assert not expression_cyk.recognize(lexer.token_kinds("12 (3 * 45)"))
+    doubling_cyk = CYKRecognizer(doubling.earley.grammar)
+    assert doubling_cyk.recognize("ab" * 6 + "a") and not doubling_cyk.recognize("a" * 12 + "bb")
+    assert CYKRecognizer(star.earley.grammar).recognize("") and not expression_cyk.recognize("")
+
+    left_expressions = ContextFreeGrammar(
+        [Terminal("+"), Terminal("*"), Terminal("n"), Terminal("("), Terminal(")")],
+        [NonTerminal("E"), NonTerminal("T"), NonTerminal("F")],
+        [
+            GrammarRule(NonTerminal("E"), [NonTerminal("E"), Terminal("+"), NonTerminal("T")]),
+            GrammarRule(NonTerminal("E"), [NonTerminal("T")]),
+            GrammarRule(NonTerminal("T"), [NonTerminal("T"), Terminal("*"), NonTerminal("F")]),
+            GrammarRule(NonTerminal("T"), [NonTerminal("F")]),
+            GrammarRule(NonTerminal("F"), [Terminal("n")]),
+            GrammarRule(NonTerminal("F"), [Terminal("("), NonTerminal("E"), Terminal(")")]),
+        ],
+        NonTerminal("E")
+    )
+    lalr = LALRParser(left_expressions)
+    assert lalr.is_lalr1() and lalr.states_count == 12
+    assert lalr.recognize(lexer.token_kinds("12 + (3 * 45)")) and not lalr.recognize(lexer.token_kinds("12 (3 * 45)"))
+    assert lalr.recognize("+".join(["(n*n)"] * 10000)) and not lalr.recognize("n+")
+    assert LALRParser(expressions).is_lalr1() and LALRParser(star.earley.grammar).recognize("")
+    e = Terminal("e")
+    not_lalr = LALRParser(ContextFreeGrammar(
+        [a, b, c, d, e],
+        [NonTerminal("S"), NonTerminal("E"), NonTerminal("F")],
+        [
+            GrammarRule(NonTerminal("S"), [a, NonTerminal("E"), c]),
+            GrammarRule(NonTerminal("S"), [a, NonTerminal("F"), d]),
+            GrammarRule(NonTerminal("S"), [b, NonTerminal("F"), c]),
+            GrammarRule(NonTerminal("S"), [b, NonTerminal("E"), d]),
+            GrammarRule(NonTerminal("E"), [e]),
+            GrammarRule(NonTerminal("F"), [e]),
+        ],
+        NonTerminal("S"),
+    ))
+    assert sorted(terminal.name for _, terminal, _, _ in not_lalr.conflicts) == ["c", "d"]
+    # b only shows up in a rule, not in the terminal list
+    unlisted = LALRParser(ContextFreeGrammar(
+        [a],
+        [NonTerminal("S")],
+        [GrammarRule(NonTerminal("S"), [a, NonTerminal("S"), b]), GrammarRule(NonTerminal("S"), [])],
+        NonTerminal("S"),
+    ))
+    assert unlisted.recognize("aabb") and not unlisted.recognize("aab") and not unlisted.recognize("c")
+
+    tree = expression_parser.parse(lexer.token_kinds("12 + (3 * 45)"))
+    assert len(tree) == len(list(tree.walk())) and tree.root.span == (0, 7)
+    assert [node.symbol.name for node in tree.root.children()] == ["T", "E(3)"]
+    tokens = [node for node in tree.walk() if node.is_token()]
+    assert [node.symbol.name for node in tokens] == ["n", "+", "(", "n", "*", "n", ")"]
+    assert [node.span for node in tokens] == [(i, i + 1) for i in range(7)]
+    assert tree.root[1].rule.right_symbols[0] == Terminal("+") and list(tree.root[1].tokens())[0] == "+"
+    try:
+        expression_parser.parse(lexer.token_kinds("12 (3 * 45)"))
+        assert False
+    except ParseError as error:
+        assert error.position == 1
+
+    # fresh helpers must not reuse the name of a symbol already in the grammar
+    taken = FromNonTerminal(NonTerminal("S"), "2")
+    shrinking = ContextFreeGrammar(
+        [a, b],
+        [NonTerminal("S"), NonTerminal("X"), taken],
+        [
+            GrammarRule(NonTerminal("S"), [a, taken]),
+            GrammarRule(taken, [b]),
+            GrammarRule(NonTerminal("X"), [NonTerminal("X")]),
+        ],
+        NonTerminal("S"),
+    )
+    assert CYKRecognizer(shrinking).recognize("ab") and not CYKRecognizer(shrinking).recognize("b")
+    builder = shrinking.remove_external_non_terminals().to_builder()
+    assert builder.fresh_non_terminal(NonTerminal("S")) is not taken
+
+    # matchers sharing a LazyDFA survive flushes caused by each other
+    third_last = rex.parse("(a|b)*a(a|b)(a|b)").rex2lts()
+    shared = third_last.lazy_determinize(3)
+    first_matcher, second_matcher = shared.matcher(), shared.matcher()
+    first_word, second_word = "abbaabab" * 3, "babbbaab" * 3
+    for first_symbol, second_symbol in zip(first_word, second_word):
+        first_matcher.feed(first_symbol)
+        second_matcher.feed(second_symbol)
+        shared.accepts("abba")
+        assert first_matcher.is_accepting() == third_last.accepts(first_word[:first_matcher.consumed])
+        assert second_matcher.is_accepting() == third_last.accepts(second_word[:second_matcher.consumed])
+    assert shared.flushes > 0
+
+    # symbols built by racing threads are one object; shared ones never change
+    barrier = threading.Barrier(8)
+    raced: List[List[Terminal]] = [list() for _ in range(8)]
+
+    def build_symbols(slot: int):
+        barrier.wait()
+        raced[slot].extend(Terminal(f"raced{index}") for index in range(500))
+
+    workers = [threading.Thread(target=build_symbols, args=(slot,)) for slot in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(symbol is expected for symbols in raced for symbol, expected in zip(symbols, raced[0]))
+    assert len({symbol.id for symbol in raced[0]}) == 500
+
+    nested_helper = FromNonTerminal(NonTerminal("X(a)"), "b")
+    assert FromNonTerminal(NonTerminal("X"), "a)(b") is nested_helper
+    assert nested_helper.internal_terminal is NonTerminal("X(a)") and nested_helper.additional_symbol == "b"
+
+    raced_rules: List[List[GrammarRule]] = [list() for _ in range(8)]
+
+    def build_rules(slot: int):
+        barrier.wait()
+        raced_rules[slot].extend(GrammarRule(NonTerminal("R"), [a] * length) for length in range(500))
+
+    workers = [threading.Thread(target=build_rules, args=(slot,)) for slot in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(rule is expected for rules in raced_rules for rule, expected in zip(rules, raced_rules[0]))
+    assert len(set(rule for rules in raced_rules for rule in rules)) == 500
+
+    # hits racing evictions in a cache smaller than the working set
+    small_cache = rex.PatternCache(max_size=2)
+    cache_errors: List[BaseException] = list()
+
+    def use_cache(slot: int):
+        barrier.wait()
+        try:
+            for index in range(300):
+                pattern = f"(a|b)*{(slot + index) % 4}"
+                assert small_cache.get(pattern).accepts(f"ab{(slot + index) % 4}")
+        except BaseException as error:
+            cache_errors.append(error)
+
+    workers = [threading.Thread(target=use_cache, args=(slot,)) for slot in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert not cache_errors and len(small_cache.compiled) <= 2
+    assert small_cache.hits + small_cache.misses == 8 * 300
+
+    # the Earley and packrat recognizers are only built on first use
+    lazy_parser = Parser(expressions)
+    assert "earley" not in vars(lazy_parser) and "packrat" not in vars(lazy_parser)
+    assert lazy_parser.is_in_language_with_earley("n+n*n") and "packrat" not in vars(lazy_parser)
+    assert lazy_parser.is_in_language_memoized("n+n*n") and lazy_parser.packrat is vars(lazy_parser)["packrat"]